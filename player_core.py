@@ -0,0 +1,1160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 播放器核心：不依赖 Qt，图形界面（player_v7.py）与无界面模式共用。
+# 无界面运行：python player_core.py [音乐文件夹] [--mode shuffle] [--lyrics]
+
+import os, sys, re, stat, random, json, bisect, time, struct, threading, subprocess, queue, asyncio, multiprocessing
+import hmac, secrets
+from concurrent.futures import Future
+from collections import namedtuple, deque
+import vlc
+import mutagen
+
+# ========== 只读文件头的时长 / 格式信息 ==========
+AudioInfo = namedtuple("AudioInfo", "duration sample_rate channels")
+
+MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+MP3_SCAN_BYTES = 64 * 1024
+_header_cache = {}
+
+def skip_id3v2(f):
+    # 返回 ID3v2 标签之后音频数据的起始偏移
+    head = f.read(10)
+    if len(head) == 10 and head[:3] == b"ID3":
+        size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        return 10 + size + (10 if head[5] & 0x10 else 0)
+    return 0
+
+def parse_mp3_frame_header(data, i):
+    # 解析 i 处的 MPEG 音频帧头；无效时返回 None
+    if data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[i + 1], data[i + 2], data[i + 3]
+    version = {3: 1, 2: 2, 0: 25}.get((b1 >> 3) & 3)
+    layer = {3: 1, 2: 2, 1: 3}.get((b1 >> 1) & 3)
+    br_index, sr_index = b2 >> 4, (b2 >> 2) & 3
+    if version is None or layer is None or br_index in (0, 15) or sr_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][br_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sr_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        spf = 384
+        frame_len = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        spf = 1152 if (layer == 2 or version == 1) else 576
+        frame_len = (spf // 8) * bitrate // sample_rate + padding
+    channels = 1 if b3 >> 6 == 3 else 2
+    return version, layer, bitrate, sample_rate, spf, frame_len, channels
+
+def read_mp3_info(f, file_size):
+    start = skip_id3v2(f)
+    f.seek(start)
+    data = f.read(MP3_SCAN_BYTES)
+    for i in range(len(data) - 4):
+        header = parse_mp3_frame_header(data, i)
+        if header is None:
+            continue
+        version, layer, bitrate, sample_rate, spf, frame_len, channels = header
+        # 下一帧也必须是同步字，排除数据中偶然出现的 0xFFE
+        nxt = i + frame_len
+        if nxt + 4 <= len(data) and parse_mp3_frame_header(data, nxt) is None:
+            continue
+        frames = None
+        if layer == 3:
+            side = (32 if channels == 2 else 17) if version == 1 else (17 if channels == 2 else 9)
+            x = i + 4 + side
+            if data[x:x + 4] in (b"Xing", b"Info") and struct.unpack(">I", data[x + 4:x + 8])[0] & 1:
+                frames = struct.unpack(">I", data[x + 8:x + 12])[0]
+            elif data[i + 36:i + 40] == b"VBRI":
+                frames = struct.unpack(">I", data[i + 50:i + 54])[0]
+        if frames:
+            return AudioInfo(frames * spf / sample_rate, sample_rate, channels)
+        # 没有 Xing/VBRI 时按首帧码率估算（与 CBR 等价），不逐帧扫描
+        audio_bytes = file_size - (start + i)
+        f.seek(-128, os.SEEK_END)
+        if f.read(3) == b"TAG":
+            audio_bytes -= 128
+        return AudioInfo(audio_bytes * 8 / bitrate, sample_rate, channels)
+    return None
+
+def read_flac_info(f, file_size):
+    start = skip_id3v2(f)
+    f.seek(start)
+    if f.read(4) != b"fLaC":
+        return None
+    block = f.read(4 + 34)
+    if len(block) < 38 or block[0] & 0x7F != 0:
+        return None
+    # STREAMINFO：采样率 20 位、声道 3 位、位深 5 位、总采样数 36 位
+    packed = int.from_bytes(block[4 + 10:4 + 18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 7) + 1
+    total = packed & ((1 << 36) - 1)
+    if not sample_rate:
+        return None
+    return AudioInfo(total / sample_rate if total else 0, sample_rate, channels)
+
+def read_wav_info(f, file_size):
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    byte_rate = sample_rate = channels = None
+    pos = 12
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        cid, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if cid == b"fmt ":
+            fmt = f.read(16)
+            _, channels, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+        elif cid == b"data":
+            if not byte_rate:
+                return None
+            size = min(size, file_size - pos - 8)
+            return AudioInfo(size / byte_rate, sample_rate, channels)
+        pos += 8 + size + (size & 1)
+    return None
+
+HEADER_READERS = {".mp3": read_mp3_info, ".flac": read_flac_info, ".wav": read_wav_info}
+
+def read_audio_info(path):
+    # 按扩展名分派，只读取所需的文件头字节；结果按 路径 + 大小 + 修改时间 缓存。
+    # 无法识别时退回 mutagen
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    info = _header_cache.get(key)
+    if info is not None:
+        return info
+    info = None
+    reader = HEADER_READERS.get(os.path.splitext(path)[1].lower())
+    if reader is not None:
+        try:
+            with open(path, "rb") as f:
+                info = reader(f, st.st_size)
+        except (OSError, struct.error, IndexError, ValueError):
+            info = None
+    if info is None:
+        audio = mutagen.File(path)
+        if audio is None or audio.info is None:
+            return AudioInfo(0, 0, 0)
+        info = AudioInfo(audio.info.length, getattr(audio.info, "sample_rate", 0),
+                         getattr(audio.info, "channels", 0))
+    if len(_header_cache) > 50000:
+        _header_cache.clear()
+    _header_cache[key] = info
+    return info
+
+def read_duration(path):
+    try:
+        return read_audio_info(path).duration
+    except Exception:
+        return 0
+
+def benchmark_duration_readers(paths):
+    # 文件头读取与 mutagen 的对比（单位：总秒数），首次读取不走缓存
+    _header_cache.clear()
+    result = {}
+    start = time.perf_counter()
+    for path in paths:
+        read_duration(path)
+    result["header"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            mutagen.File(path).info.length
+        except Exception:
+            pass
+    result["mutagen"] = time.perf_counter() - start
+    return result
+
+# ========== 歌词解析 ==========
+WORD_TAG = re.compile(r"<(\d+):(\d+(?:\.\d+)?)>")
+
+def parse_word_timing(text, line_start):
+    # 返回 (纯文本, [(开始秒, 片段), ...], 行尾时间或 None)；无逐字标签时片段列表为空
+    parts = WORD_TAG.split(text)
+    if len(parts) == 1:
+        return text, [], None
+    words = []
+    end = None
+    if parts[0]:
+        words.append((line_start, parts[0]))
+    for i in range(1, len(parts), 3):
+        t = int(parts[i]) * 60 + float(parts[i + 1])
+        frag = parts[i + 2]
+        if frag:
+            words.append((t, frag))
+        elif i + 3 >= len(parts):
+            end = t
+    return "".join(w for _, w in words).strip(), words, end
+
+def read_lyrics(path):
+    # 返回 (歌词 [(秒, 文本)], 逐字信息 [(片段列表, 行尾时间)])，两者按时间排序、一一对应
+    entries = []
+    folder = os.path.dirname(path)
+    base = os.path.splitext(os.path.basename(path))[0]
+    for f in os.listdir(folder):
+        if f.endswith(".lrc") and base in f:
+            with open(os.path.join(folder, f), encoding="utf-8", errors="ignore") as lrc:
+                for line in lrc:
+                    if "[" in line and "]" in line:
+                        try:
+                            time_tag = line[line.find("[")+1:line.find("]")]
+                            text = line[line.find("]")+1:].strip()
+                            mins, secs = time_tag.split(":")
+                            sec = int(mins) * 60 + float(secs)
+                            text, words, end = parse_word_timing(text, sec)
+                            entries.append((sec, text, words, end))
+                        except:
+                            continue
+            break
+    entries.sort(key=lambda e: e[0])
+    return [(e[0], e[1]) for e in entries], [(e[2], e[3]) for e in entries]
+
+# ========== VLC 实例配置 ==========
+# 纯音频播放器用不到视频输出、字幕、OSD 等模块；各配置只差在缓存时长上
+VLC_AUDIO_ARGS = ["--no-video", "--no-spu", "--no-osd", "--no-stats", "--no-snapshot-preview",
+                  "--no-video-title-show", "--no-sub-autodetect-file", "--no-lua",
+                  "--no-metadata-network-access", "--quiet"]
+VLC_PROFILES = {
+    "default": [],
+    "minimal": VLC_AUDIO_ARGS + ["--file-caching=300"],
+    "low_latency": VLC_AUDIO_ARGS + ["--file-caching=50", "--network-caching=150", "--live-caching=50"],
+    "slow_network": VLC_AUDIO_ARGS + ["--file-caching=2000", "--network-caching=5000"],
+}
+VLC_PROFILE_NAMES = {"default": "默认", "minimal": "精简音频", "low_latency": "低延迟", "slow_network": "慢速网络"}
+
+def create_vlc_instance(profile):
+    # 参数不被当前 libvlc 接受时 Instance 会返回 None，此时退回默认参数
+    instance = vlc.Instance(VLC_PROFILES.get(profile, []))
+    if instance is None:
+        print(f"VLC 配置「{profile}」无法创建实例，改用默认参数")
+        instance = vlc.Instance()
+    return instance
+
+def current_rss_mb():
+    # 优先用 psutil 取当前常驻内存；没有时用 resource 的峰值（Windows 上没有则返回 None）
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2 ** 20 if sys.platform == "darwin" else 1024)
+
+def probe_vlc_profile(profile, path=None):
+    # 在全新进程中运行：实例创建耗时、（可选）开始出声耗时、内存增量
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    instance = create_vlc_instance(profile)
+    player = instance.media_player_new()
+    result = {"startup_ms": (time.perf_counter() - start) * 1000, "first_audio_ms": None}
+    if path:
+        player.set_media(instance.media_new(path))
+        player.audio_set_volume(0)
+        player.play()
+        deadline = time.perf_counter() + 5
+        while player.get_time() <= 0 and time.perf_counter() < deadline:
+            time.sleep(0.005)
+        result["first_audio_ms"] = (time.perf_counter() - start) * 1000
+        time.sleep(0.5)  # 让解码和输出模块都加载完再量内存
+    rss_after = current_rss_mb()
+    player.stop()
+    result["rss_mb"] = rss_after
+    result["rss_delta_mb"] = rss_after - rss_before if rss_after is not None else None
+    return result
+
+def benchmark_vlc_profiles(path=None, rounds=3):
+    # 每个配置每轮都开一个新进程，避免共享插件缓存和已加载的模块；取中位数
+    command = [sys.executable] if getattr(sys, "frozen", False) else [sys.executable, os.path.abspath(__file__)]
+    results = {}
+    for profile in VLC_PROFILES:
+        runs = []
+        for _ in range(rounds):
+            out = subprocess.run(command + ["--vlc-probe", profile] + ([path] if path else []),
+                                 capture_output=True, text=True, timeout=60).stdout
+            lines = [l for l in out.splitlines() if l.startswith("{")]
+            if lines:
+                runs.append(json.loads(lines[-1]))
+        if not runs:
+            continue
+        def median(key):
+            values = sorted(r[key] for r in runs if r[key] is not None)
+            return values[len(values) // 2] if values else None
+        results[profile] = {key: median(key) for key in ("startup_ms", "first_audio_ms", "rss_mb", "rss_delta_mb")}
+    return results
+
+# ========== 插值播放时钟 ==========
+class PlaybackClock:
+    # 以 VLC 的 TimeChanged 事件为锚点，两次事件之间用 time.monotonic() 插值，
+    # now() 不经过 libvlc，歌词、进度条和悬浮窗可以 60Hz 随意调用
+    JITTER = 0.03  # 与插值相差小于该值的锚点视为抖动，避免时间倒退
+
+    def __init__(self):
+        self._anchor = (0.0, time.monotonic())
+        self.playing = False
+        self.rate = 1.0
+        self.length = 0.0
+        self.source = None
+
+    def attach(self, player):
+        # 可以挂在多个播放器上，只有 follow() 指定的那个播放器的事件会生效
+        def only_source(handler):
+            return lambda e: handler(e) if self.source is player else None
+        em = player.event_manager()
+        em.event_attach(vlc.EventType.MediaPlayerTimeChanged, only_source(self._on_time_changed))
+        em.event_attach(vlc.EventType.MediaPlayerLengthChanged, only_source(self._on_length_changed))
+        em.event_attach(vlc.EventType.MediaPlayerPlaying, only_source(lambda e: self.resume()))
+        em.event_attach(vlc.EventType.MediaPlayerPaused, only_source(lambda e: self.pause()))
+        em.event_attach(vlc.EventType.MediaPlayerStopped, only_source(lambda e: self.pause()))
+
+    def follow(self, player):
+        self.source = player
+
+    def now(self):
+        t, at = self._anchor
+        if not self.playing:
+            return t
+        return t + (time.monotonic() - at) * self.rate
+
+    def anchor(self, media_time):
+        if self.playing and abs(media_time - self.now()) < self.JITTER:
+            return
+        self._anchor = (media_time, time.monotonic())
+
+    def seek(self, media_time):
+        self._anchor = (max(0.0, media_time), time.monotonic())
+
+    def pause(self):
+        if self.playing:
+            self._anchor = (self.now(), time.monotonic())
+            self.playing = False
+
+    def resume(self):
+        if not self.playing:
+            self._anchor = (self._anchor[0], time.monotonic())
+            self.playing = True
+
+    def set_rate(self, rate):
+        self._anchor = (self.now(), time.monotonic())
+        self.rate = rate if rate > 0 else 1.0
+
+    def reset(self):
+        self.playing = False
+        self.length = 0.0
+        self._anchor = (0.0, time.monotonic())
+
+    # 以下回调运行在 VLC 的事件线程中，只做元组赋值
+    def _on_time_changed(self, event):
+        self.anchor(event.u.new_time / 1000)
+
+    def _on_length_changed(self, event):
+        self.length = event.u.new_length / 1000
+
+# ========== 不重复随机播放 ==========
+class ShuffleBag:
+    # 惰性 Fisher–Yates：order[:remaining] 是本轮还没播放的曲目。peek 只挑选不取出，
+    # 曲目真正开始播放时才用 take 把它移出本轮，因此被放弃的预选不会丢失；
+    # 新增曲目直接放进本轮待抽区域，不需要整体重新洗牌
+    SPREAD_TRIES = 8
+
+    def __init__(self):
+        self.order = []
+        self.slot = []  # 曲目下标 → 在 order 中的位置
+        self.remaining = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def reset(self, count):
+        self.order = list(range(count))
+        self.slot = list(range(count))
+        self.remaining = count
+
+    def _swap(self, i, j):
+        a, b = self.order[i], self.order[j]
+        self.order[i], self.order[j] = b, a
+        self.slot[a], self.slot[b] = j, i
+
+    def add(self, index):
+        self.order.append(index)
+        self.slot.append(len(self.order) - 1)
+        self._swap(len(self.order) - 1, self.remaining)
+        self.remaining += 1
+
+    def peek(self, avoid=None):
+        # avoid(index) 返回 True 表示尽量不要选它（如与上一首同一歌手），最多重试固定次数
+        if not self.order:
+            return None
+        remaining = self.remaining or len(self.order)  # 本轮已抽完时从新一轮里挑
+        j = random.randrange(remaining)
+        if avoid is not None:
+            for _ in range(self.SPREAD_TRIES):
+                if not avoid(self.order[j]):
+                    break
+                j = random.randrange(remaining)
+        return self.order[j]
+
+    def take(self, index):
+        # 曲目开始播放：移出本轮（已不在本轮中则不变）
+        if not 0 <= index < len(self.order):
+            return
+        if self.remaining == 0:
+            self.remaining = len(self.order)
+        pos = self.slot[index]
+        if pos < self.remaining:
+            self._swap(pos, self.remaining - 1)
+            self.remaining -= 1
+
+class ShuffleEngine:
+    # 随机抽取 + 有界的前进 / 后退历史；上一首在随机模式下真正回到之前播放的曲目。
+    # next() 没有副作用（无缝播放会提前询问并可能作废），状态只在 visit() 时改变
+    def __init__(self, history_size=200):
+        self.bag = ShuffleBag()
+        self.history = []
+        self.pos = -1
+        self.pending = None  # 尚未播放的预选曲目，重复询问时保持不变
+        self.history_size = history_size
+        self.artist_of = None  # 设置后启用歌手分散模式
+
+    def sync(self, count):
+        # 播放列表只增不减时把新曲目加入本轮；有删除则重建
+        if count < len(self.bag):
+            self.reset(count)
+        else:
+            for index in range(len(self.bag), count):
+                self.bag.add(index)
+
+    def reset(self, count):
+        self.bag.reset(count)
+        self.history = []
+        self.pos = -1
+        self.pending = None
+
+    def next(self, count):
+        self.sync(count)
+        if self.pos < len(self.history) - 1:
+            return self.history[self.pos + 1]
+        if self.pending is None:
+            avoid = None
+            if self.artist_of is not None and self.history:
+                last_artist = self.artist_of(self.history[self.pos])
+                if last_artist is not None:
+                    avoid = lambda i: self.artist_of(i) == last_artist
+            self.pending = self.bag.peek(avoid)
+        return self.pending
+
+    def prev(self):
+        if self.pos > 0:
+            return self.history[self.pos - 1]
+        return None
+
+    def visit(self, index):
+        # 曲目开始播放时调用：沿历史前进 / 后退时只移动位置，否则记为新曲目并移出本轮
+        if 0 <= self.pos < len(self.history) and self.history[self.pos] == index:
+            return
+        if self.pos + 1 < len(self.history) and self.history[self.pos + 1] == index:
+            self.pos += 1
+            return
+        if self.pos > 0 and self.history[self.pos - 1] == index:
+            self.pos -= 1
+            return
+        del self.history[self.pos + 1:]
+        self.history.append(index)
+        if len(self.history) > self.history_size:
+            del self.history[0]
+        self.pos = len(self.history) - 1
+        self.bag.take(index)
+        self.pending = None
+
+def artist_from_filename(path):
+    # 按常见的 "歌手 - 歌名" 文件名约定取歌手，取不到时返回 None
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if " - " in stem:
+        return stem.split(" - ", 1)[0].strip().lower()
+    return None
+
+# ========== 播放列表与状态持久化 ==========
+MUSIC_EXTENSIONS = (".mp3", ".wav", ".flac")
+STATE_FILE = "playlist.json"
+
+def list_music_files(folder):
+    return [os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(MUSIC_EXTENSIONS)]
+
+def save_state(playlist, current_index, position, play_queue, file=STATE_FILE):
+    data = {
+        "playlist": playlist,
+        "current_index": current_index,
+        "position": position,
+        "queue": list(play_queue)
+    }
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def load_state(file=STATE_FILE):
+    # 返回 (播放列表, 当前下标, 位置秒, 待播队列)；文件不存在时返回 None
+    if not os.path.exists(file):
+        return None
+    with open(file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return (data.get("playlist", []), data.get("current_index", 0),
+            data.get("position", 0), deque(data.get("queue", [])))
+
+class PlaylistLogic:
+    # 选曲、待播队列、状态持久化与控制命令，界面与无界面核心共用。使用者需提供属性：
+    # playlist、current_index、current_path、play_mode、play_queue（deque）、shuffle（ShuffleEngine）、
+    # clock（PlaybackClock）、pending_restore、_path_index，
+    # 以及方法：play_index、play、pause、toggle_pause、seek_to、set_mode、track_length、publish；
+    # playlist_loaded、queue_changed 为可选的通知钩子
+    MODES = ("loop_all", "loop_one", "shuffle")
+    state_file = STATE_FILE
+
+    def playlist_loaded(self):
+        pass
+
+    def queue_changed(self):
+        pass
+
+    def playlist_changed(self):
+        # 修改 playlist 后调用；路径 → 下标映射在下次查询时重建一次
+        self._path_index = None
+
+    def index_of(self, path):
+        # 查不到直接返回 None，不重建映射：待播队列里大量失效路径也只是 O(1) 一次
+        if self._path_index is None:
+            self._path_index = {p: i for i, p in enumerate(self.playlist)}
+        index = self._path_index.get(path)
+        if index is not None and (index >= len(self.playlist) or self.playlist[index] != path):
+            self.playlist_changed()  # 有修改漏了通知，重建一次
+            return self.index_of(path)
+        return index
+
+    def set_playlist(self, playlist, play_queue=()):
+        self.playlist = playlist
+        self.playlist_changed()
+        self.play_queue = deque(play_queue)
+        self.shuffle.reset(len(playlist))
+        self.playlist_loaded()
+
+    def load_folder(self, folder):
+        self.set_playlist(list_music_files(folder))  # 旧文件夹的待播曲目不再有效
+        if self.playlist:
+            self.play_index(0)
+
+    def restore(self):
+        try:
+            state = load_state(self.state_file)
+        except (OSError, ValueError) as e:
+            print("加载播放列表失败：", e)
+            return False
+        if state is None or not state[0]:
+            return False
+        playlist, index, position, play_queue = state
+        self.set_playlist(playlist, play_queue)
+        self.pending_restore = position  # 进入播放状态后再跳转；在此之前保存状态时沿用该位置
+        self.play_index(min(max(0, index), len(self.playlist) - 1))
+        return True
+
+    def save_state(self):
+        try:
+            position = self.pending_restore if self.pending_restore is not None else self.clock.now()
+            save_state(self.playlist, self.current_index, max(0, position), self.play_queue, self.state_file)
+        except Exception as e:
+            print("保存播放列表失败：", e)
+
+    def enqueue(self, paths, play_next=False):
+        # 批量入队 O(k)；"下一首播放" 保持所选曲目的原有顺序插到队首
+        if play_next:
+            self.play_queue.extendleft(reversed(paths))
+        else:
+            self.play_queue.extend(paths)
+        self.queue_changed()
+        self.publish("queue", queue=list(self.play_queue))
+        self.save_state()
+
+    def status(self):
+        return {"index": self.current_index, "path": self.current_path, "mode": self.play_mode,
+                "playing": self.clock.playing, "time": self.clock.now(), "length": self.track_length(),
+                "queue": list(self.play_queue)}
+
+    def peek_queue(self):
+        # 返回队首曲目在播放列表中的下标；已不在列表中的曲目直接丢弃
+        while self.play_queue:
+            index = self.index_of(self.play_queue[0])
+            if index is not None:
+                return index
+            self.play_queue.popleft()
+        return None
+
+    def pick_next_index(self):
+        # 按播放模式决定结束后播放哪一首
+        if not self.playlist:
+            return None
+        queued = self.peek_queue()
+        if queued is not None:
+            return queued
+        if self.play_mode == "loop_one":
+            return self.current_index
+        if self.play_mode == "shuffle":
+            return self.shuffle.next(len(self.playlist))
+        return (self.current_index + 1) % len(self.playlist)
+
+    def play_next(self):
+        # 手动下一首：队列优先，不停留在单曲循环
+        if not self.playlist:
+            return
+        index = self.peek_queue()
+        if index is None:
+            if self.play_mode == "shuffle":
+                index = self.shuffle.next(len(self.playlist))
+            else:
+                index = (self.current_index + 1) % len(self.playlist)
+        self.play_index(index)
+
+    def play_prev(self):
+        if not self.playlist:
+            return
+        index = self.shuffle.prev() if self.play_mode == "shuffle" else None
+        if index is None:
+            index = (self.current_index - 1) % len(self.playlist)
+        self.play_index(index)
+
+    def control_command(self, cmd, args):
+        # 控制接口命令；除 search 外都返回执行后的状态，参数不合法时抛出 ValueError
+        if cmd == "play":
+            self.play()
+        elif cmd == "pause":
+            self.pause()
+        elif cmd == "toggle":
+            self.toggle_pause()
+        elif cmd == "next":
+            self.play_next()
+        elif cmd == "prev":
+            self.play_prev()
+        elif cmd == "seek":
+            self.seek_to(float(args["seconds"]))
+        elif cmd == "play_index":
+            index = int(args["index"])
+            if not 0 <= index < len(self.playlist):
+                raise ValueError("下标超出播放列表")
+            self.play_index(index)
+        elif cmd == "enqueue":
+            paths = args["paths"]
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                raise ValueError("paths 必须是字符串数组")
+            self.enqueue(paths, bool(args.get("play_next", False)))
+        elif cmd == "mode":
+            if args["mode"] not in self.MODES:
+                raise ValueError(f"未知模式：{args['mode']}")
+            self.set_mode(args["mode"])
+        elif cmd == "search":
+            return self.search(args.get("query", ""), int(args.get("limit", 50)))
+        elif cmd != "status":
+            raise ValueError(f"未知命令：{cmd}")
+        return self.status()
+
+    def search(self, query, limit=50):
+        # 按文件名做不区分大小写的子串匹配
+        query = str(query).lower()
+        found = []
+        for index, path in enumerate(self.playlist):
+            title = os.path.basename(path)
+            if query in title.lower():
+                found.append({"index": index, "path": path, "title": title})
+                if len(found) >= limit:
+                    break
+        return found
+
+# ========== 无界面播放核心 ==========
+class PlayerCore(PlaylistLogic):
+    # 播放列表、播放模式、待播队列、VLC 控制、状态持久化和歌词定时，不创建任何窗口。
+    # libvlc 调用都在 run() 所在线程执行；VLC 事件线程和其他线程通过 call() 投递命令。
+    # 状态变化通过 listeners 推送：fn(事件名, 数据字典)
+    POSITION_INTERVAL = 1.0
+
+    def __init__(self, vlc_profile="minimal", state_file=STATE_FILE):
+        self.instance = create_vlc_instance(vlc_profile)
+        self.player = self.instance.media_player_new()
+        self.clock = PlaybackClock()
+        self.clock.attach(self.player)
+        self.clock.follow(self.player)
+        self.state_file = state_file
+        self.playlist = []
+        self.current_index = -1
+        self.current_path = None
+        self.play_mode = "loop_all"
+        self.play_queue = deque()
+        self.shuffle = ShuffleEngine()
+        self._path_index = None
+        self.lyrics = []
+        self.lyric_times = []
+        self.lyric_index = -1
+        self.pending_restore = None
+        self.listeners = []
+        self.commands = queue.Queue()
+        self.running = False
+        self._was_playing = False
+        self._last_position = 0.0
+        em = self.player.event_manager()
+        em.event_attach(vlc.EventType.MediaPlayerEndReached, lambda e: self.call("_on_ended"))
+        em.event_attach(vlc.EventType.MediaPlayerEncounteredError, lambda e: self.call("_on_error"))
+
+    # ---- 线程安全的入口 ----
+    def call(self, name, *args):
+        self.commands.put((name, args))
+
+    def request(self, cmd, args):
+        # 控制接口入口（任意线程）：命令在播放线程执行，结果通过 Future 返回
+        future = Future()
+        self.call("_run_request", future, cmd, args)
+        return future
+
+    def _run_request(self, future, cmd, args):
+        try:
+            future.set_result(self.control_command(cmd, args))
+        except Exception as e:
+            future.set_exception(e)
+
+    def publish(self, event, **data):
+        for listener in list(self.listeners):
+            try:
+                listener(event, data)
+            except Exception as e:
+                print("事件回调出错：", e)
+
+    def run(self):
+        # 命令循环；空闲时只在下一行歌词边界或位置推送时醒来
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    name, args = self.commands.get(timeout=self._next_wakeup())
+                    getattr(self, name)(*args)
+                except queue.Empty:
+                    pass
+                except Exception as e:
+                    print("命令执行失败：", e)
+                self._tick()
+        finally:
+            self.save_state()
+            self.player.stop()
+
+    def stop(self):
+        self.running = False
+
+    # ---- 播放控制 ----
+    def play_index(self, index):
+        if not 0 <= index < len(self.playlist):
+            return
+        self.current_index = index
+        path = self.playlist[index]
+        self.clock.reset()
+        self.player.set_media(self.instance.media_new(path))
+        self.player.play()
+        self.current_path = path
+        if self.play_queue and self.play_queue[0] == path:
+            self.play_queue.popleft()
+        self.shuffle.visit(index)
+        try:
+            self.lyrics = read_lyrics(path)[0]
+        except OSError:
+            self.lyrics = []
+        self.lyric_times = [t for t, _ in self.lyrics]
+        self.lyric_index = -1
+        self.publish("track", index=index, path=path, title=os.path.basename(path))
+        self.save_state()
+
+    def play(self):
+        if self.current_path is None:
+            self.play_index(max(0, self.current_index))
+        else:
+            self.player.set_pause(0)
+
+    def pause(self):
+        self.player.set_pause(1)
+
+    def toggle_pause(self):
+        if self.clock.playing:
+            self.pause()
+        else:
+            self.play()
+
+    def seek_to(self, seconds):
+        seconds = max(0.0, float(seconds))
+        self.player.set_time(int(seconds * 1000))
+        self.clock.seek(seconds)
+        self.lyric_index = -1
+
+    def set_mode(self, mode):
+        if mode in self.MODES:
+            self.play_mode = mode
+            self.publish("mode", mode=mode)
+
+    def track_length(self):
+        return self.clock.length
+
+    # ---- 内部 ----
+    def _on_ended(self):
+        index = self.pick_next_index()
+        if index is not None:
+            self.play_index(index)
+
+    def _on_error(self):
+        print("播放出错，跳到下一首：", self.current_path)
+        if len(self.playlist) > 1:
+            self.play_next()
+
+    def _next_wakeup(self):
+        if not self.clock.playing:
+            return self.POSITION_INTERVAL
+        delay = self.POSITION_INTERVAL
+        nxt = self.lyric_index + 1
+        if self.lyric_index >= 0 and nxt < len(self.lyric_times):
+            delay = min(delay, (self.lyric_times[nxt] - self.clock.now()) / self.clock.rate + 0.001)
+        return max(0.001, delay)
+
+    def _tick(self):
+        playing = self.clock.playing
+        if playing != self._was_playing:
+            self._was_playing = playing
+            if playing and self.pending_restore is not None:
+                position, self.pending_restore = self.pending_restore, None
+                self.seek_to(position)
+            self.publish("state", playing=playing)
+        now = self.clock.now()
+        if self.lyric_times:
+            index = max(0, bisect.bisect_right(self.lyric_times, now) - 1)
+            if index != self.lyric_index:
+                self.lyric_index = index
+                self.publish("lyric", index=index, text=self.lyrics[index][1])
+        if playing and time.monotonic() - self._last_position >= self.POSITION_INTERVAL:
+            self._last_position = time.monotonic()
+            self.publish("position", time=now, length=self.clock.length)
+
+# ========== 本地控制接口 ==========
+CONTROL_DEFAULT = "tcp:127.0.0.1:8765"
+CONTROL_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".player_control_token")
+
+class _ControlClient:
+    def __init__(self, writer, limit):
+        self.writer = writer
+        self.queue = asyncio.Queue(limit)  # 回复与推送共用，保证顺序
+        self.events = set()
+        self.tasks = ()  # (_serve 任务, _send_loop 任务)，关闭服务时统一取消
+        self.authed = False
+        self.closing = False  # 发完已排队的回复后断开
+
+class ControlServer:
+    # asyncio 服务，事件循环跑在自己的线程里，不占用界面线程。协议为每行一个 JSON，
+    # 地址 "tcp:127.0.0.1:端口"（只监听本机）或 "unix:/路径"：
+    #   请求 {"id": 1, "cmd": "next", "args": {}} → 回复 {"id": 1, "ok": true, "result": ...}
+    #   {"cmd": "subscribe", "args": {"events": ["track", "lyric"]}} 之后服务端主动推送 {"event": ..., ...}
+    # 每次启动生成随机令牌写入 token_file（仅当前用户可读）；连接后的第一条请求必须是
+    #   {"cmd": "auth", "args": {"token": "..."}}，否则回复错误并断开。任何无法解析的行也会断开连接，
+    # 这样网页里的 fetch 发到本机端口的 HTTP 请求头不会被当成命令执行
+    # handler(cmd, args) 返回 concurrent.futures.Future，由播放器在自己的线程里完成
+    EVENTS = ("track", "state", "lyric", "position", "mode", "queue")
+    QUEUE_LIMIT = 256       # 每个客户端积压的消息上限，超过即断开该慢客户端
+    REQUEST_TIMEOUT = 5.0
+    LINE_LIMIT = 4 * 1024 * 1024  # 单行请求上限；asyncio 默认 64KB，装不下上千条路径的批量入队
+
+    def __init__(self, handler, address=CONTROL_DEFAULT, token_file=CONTROL_TOKEN_FILE):
+        self.handler = handler
+        self.address = address
+        self.token_file = token_file
+        self.token = None
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.clients = set()   # 有订阅的客户端，只在事件循环线程中访问
+        self.connections = set()  # 所有在线客户端，同上
+        self.subscribed = 0    # 订阅者数量，publish 据此在无人订阅时直接返回
+
+    def start(self):
+        try:
+            self.token = self._write_token()
+        except OSError as e:
+            print("控制接口令牌写入失败：", e)
+            return False
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), name="control-api", daemon=True)
+        self.thread.start()
+        ready.wait(5)
+        return self.server is not None
+
+    def stop(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(2)
+        self.thread = None
+
+    def _write_token(self):
+        token = secrets.token_hex(16)
+        fd = os.open(self.token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(token)
+        os.chmod(self.token_file, 0o600)  # 文件已存在时 os.open 不会改权限
+        return token
+
+    def publish(self, event, **data):
+        # 任意线程调用；每个事件只序列化一次，再交给事件循环分发
+        if not self.subscribed or self.thread is None:
+            return
+        line = (json.dumps(dict(data, event=event), ensure_ascii=False) + "\n").encode("utf-8")
+        self.loop.call_soon_threadsafe(self._broadcast, event, line)
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(self._listen())
+        except (OSError, ValueError) as e:
+            print("控制接口启动失败：", e)
+            ready.set()
+            self.loop.close()
+            return
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # 先取消并等完所有连接的任务再关闭事件循环，否则它们会在已关闭的循环上报错
+            self.server.close()
+            tasks = [task for client in self.connections for task in client.tasks]
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+            self.server = None
+
+    async def _listen(self):
+        kind, _, where = self.address.partition(":")
+        if kind == "unix":
+            try:
+                if stat.S_ISSOCK(os.stat(where).st_mode):
+                    os.remove(where)  # 上次未清理的套接字；其他类型的文件不动，让启动报错
+            except FileNotFoundError:
+                pass
+            return await asyncio.start_unix_server(self._serve, path=where, limit=self.LINE_LIMIT)
+        host, _, port = where.rpartition(":")
+        return await asyncio.start_server(self._serve, host or "127.0.0.1", int(port), backlog=1024,
+                                          limit=self.LINE_LIMIT)
+
+    def _broadcast(self, event, line):
+        for client in list(self.clients):
+            if event not in client.events:
+                continue
+            try:
+                client.queue.put_nowait(line)
+            except asyncio.QueueFull:
+                self._drop(client)
+                client.writer.close()
+
+    def _drop(self, client):
+        if client in self.clients:
+            self.clients.discard(client)
+            self.subscribed -= 1
+
+    async def _send_loop(self, client):
+        try:
+            while True:
+                line = await client.queue.get()
+                client.writer.write(line)
+                await client.writer.drain()
+                client.queue.task_done()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def _serve(self, reader, writer):
+        client = _ControlClient(writer, self.QUEUE_LIMIT)
+        sender = asyncio.ensure_future(self._send_loop(client))
+        client.tasks = (asyncio.current_task(), sender)
+        self.connections.add(client)
+        try:
+            while not client.closing:
+                line = await self._read_line(reader)
+                if line is None:
+                    client.queue.put_nowait(self._reply(None, False, "请求过长"))
+                    continue
+                if not line:
+                    break
+                client.queue.put_nowait(await self._handle(client, line))
+            await asyncio.wait_for(client.queue.join(), self.REQUEST_TIMEOUT)  # 发完已排队的回复再断开
+        except (ConnectionError, asyncio.QueueFull, asyncio.TimeoutError, asyncio.CancelledError):
+            pass  # 断开、积压过多或服务关闭
+        finally:
+            self.connections.discard(client)
+            self._drop(client)
+            sender.cancel()
+            writer.close()
+
+    async def _read_line(self, reader):
+        # 读一行，对方关闭时返回 b""；超过 LINE_LIMIT 时丢弃这一行并返回 None，连接继续可用
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        try:
+            while True:
+                await reader.readexactly(consumed)
+                try:
+                    await reader.readuntil(b"\n")
+                    return None
+                except asyncio.LimitOverrunError as e:
+                    consumed = e.consumed
+        except asyncio.IncompleteReadError:
+            return b""
+
+    async def _handle(self, client, line):
+        try:
+            request = json.loads(line)
+            rid, cmd, args = request.get("id"), request.get("cmd"), request.get("args") or {}
+        except (ValueError, AttributeError):
+            client.closing = True
+            return self._reply(None, False, "无效的请求")
+        if not isinstance(args, dict):
+            return self._reply(rid, False, "args 必须是对象")
+        if not client.authed:
+            token = args.get("token")
+            if cmd != "auth" or not isinstance(token, str) or not hmac.compare_digest(token, self.token):
+                client.closing = True
+                return self._reply(rid, False, "未认证")
+            client.authed = True
+            return self._reply(rid, True, None)
+        if cmd == "subscribe":
+            names = args.get("events") or self.EVENTS
+            if not isinstance(names, (list, tuple)):
+                return self._reply(rid, False, "events 必须是数组")
+            events = {name for name in names if name in self.EVENTS}
+            self._drop(client)
+            client.events = events
+            if events:
+                self.clients.add(client)
+                self.subscribed += 1
+            return self._reply(rid, True, sorted(events))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(self.handler(cmd, args)), self.REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            return self._reply(rid, False, "执行超时")
+        except Exception as e:
+            return self._reply(rid, False, str(e))
+        return self._reply(rid, True, result)
+
+    def _reply(self, rid, ok, value):
+        key = "result" if ok else "error"
+        return (json.dumps({"id": rid, "ok": ok, key: value}, ensure_ascii=False) + "\n").encode("utf-8")
+
+# ========== 命令行入口 ==========
+CLI_HELP = "命令：p 播放/暂停，n 下一首，b 上一首，s <秒> 跳转，m <loop_all|loop_one|shuffle> 模式，" \
+           "q <路径> 入队，i 状态，x 退出"
+
+def run_command(core, line):
+    # 从标准输入线程调用，只投递命令
+    cmd, _, arg = line.strip().partition(" ")
+    arg = arg.strip()
+    if cmd == "p":
+        core.call("toggle_pause")
+    elif cmd == "n":
+        core.call("play_next")
+    elif cmd == "b":
+        core.call("play_prev")
+    elif cmd == "s" and arg:
+        try:
+            seconds = float(arg)
+        except ValueError:
+            print(CLI_HELP)  # 输入有误不能让标准输入线程退出
+            return
+        core.call("seek_to", seconds)
+    elif cmd == "m" and arg:
+        core.call("set_mode", arg)
+    elif cmd == "q" and arg:
+        core.call("enqueue", [arg])
+    elif cmd == "i":
+        print(json.dumps(core.status(), ensure_ascii=False))
+    elif cmd == "x":
+        core.call("stop")
+    elif cmd:
+        print(CLI_HELP)
+
+def main(argv=None):
+    import argparse
+    started = time.perf_counter()
+    argv = sys.argv[1:] if argv is None else argv
+    # VLC 实例配置探针（由 benchmark_vlc_profiles 在子进程中调用），输出一行 JSON
+    if "--vlc-probe" in argv:
+        i = argv.index("--vlc-probe")
+        print(json.dumps(probe_vlc_profile(argv[i + 1], argv[i + 2] if len(argv) > i + 2 else None)))
+        return 0
+    parser = argparse.ArgumentParser(description="无界面播放器")
+    parser.add_argument("folder", nargs="?", help="音乐文件夹；省略时恢复上次的播放列表")
+    parser.add_argument("--mode", choices=PlayerCore.MODES)
+    parser.add_argument("--vlc-profile", choices=list(VLC_PROFILES),
+                        default=os.environ.get("MYPLAYER_VLC_PROFILE") or "minimal")
+    parser.add_argument("--lyrics", action="store_true", help="打印当前歌词行")
+    parser.add_argument("--stats", action="store_true", help="打印启动耗时与内存")
+    parser.add_argument("--control", nargs="?", const=CONTROL_DEFAULT, default=os.environ.get("MYPLAYER_CONTROL"),
+                        metavar="ADDRESS", help=f"开启本地控制接口（默认 {CONTROL_DEFAULT}，或 unix:/路径）")
+    args = parser.parse_args(argv)
+
+    core = PlayerCore(args.vlc_profile)
+    def on_event(event, data):
+        if event == "track":
+            print("♪", data["title"])
+        elif event == "lyric" and args.lyrics and data["text"]:
+            print("  ", data["text"])
+    core.listeners.append(on_event)
+    server = None
+    if args.control:
+        server = ControlServer(core.request, args.control)
+        if server.start():
+            core.listeners.append(lambda event, data: server.publish(event, **data))
+            print(f"控制接口：{args.control}，令牌文件：{server.token_file}")
+    if args.mode:
+        core.set_mode(args.mode)
+    if args.folder:
+        core.load_folder(args.folder)
+    elif not core.restore():
+        print("没有可播放的曲目")
+        return 1
+    if args.stats:
+        rss = current_rss_mb()
+        print(f"启动 {(time.perf_counter() - started) * 1000:.0f} ms，RSS "
+              + (f"{rss:.1f} MB" if rss is not None else "未知"))
+
+    def read_stdin():
+        # 标准输入关闭（如作为服务运行）时只是不再接收命令，播放继续
+        for line in sys.stdin:
+            run_command(core, line)
+    if sys.stdin is not None:
+        if sys.stdin.isatty():
+            print(CLI_HELP)
+        threading.Thread(target=read_stdin, daemon=True).start()
+    try:
+        core.run()  # 退出时（含 Ctrl+C）会保存状态
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.stop()
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
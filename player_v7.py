@@ -1,19 +1,31 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, sys, io, random, json
+import os, sys, io, json, bisect, time, hashlib, math, ctypes, threading, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed, TimeoutError as FutureTimeout
+from collections import OrderedDict, deque
 import vlc
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout,
     QLabel, QListWidget, QSlider, QTextBrowser, QFileDialog, QMenu,
     QSizePolicy, QListWidgetItem, QSystemTrayIcon, QAction, QFrame,
-    QDialog, QLineEdit, QGraphicsDropShadowEffect
+    QDialog, QLineEdit, QGraphicsDropShadowEffect, QListView
 )
-from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QSize, QEasingCurve, QSettings
-from PyQt5.QtGui import QFont, QPixmap, QTextCursor, QIcon
-from mutagen.mp3 import MP3
+from PyQt5.QtCore import (
+    Qt, QTimer, QPropertyAnimation, QSize, QEasingCurve, QSettings, QRect,
+    QObject, QRunnable, QThreadPool, QAbstractListModel, QModelIndex, QEvent,
+    pyqtSignal, pyqtProperty
+)
+from PyQt5.QtGui import QFont, QPixmap, QImage, QIcon, QPainter, QColor, QFontMetrics, QPalette
+import mutagen
 from mutagen.id3 import ID3
 from PIL import Image
+from player_core import (
+    read_duration, benchmark_duration_readers, read_lyrics,
+    VLC_PROFILES, VLC_PROFILE_NAMES, create_vlc_instance, probe_vlc_profile,
+    benchmark_vlc_profiles, PlaybackClock, ShuffleEngine, artist_from_filename,
+    MUSIC_EXTENSIONS, PlaylistLogic, ControlServer, CONTROL_DEFAULT
+)
 
 try:
     from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
@@ -22,11 +34,134 @@ try:
 except ImportError:
     PYCAW_AVAILABLE = False
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import soundfile
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+# 响度分析和波形需要解码 MP3 / FLAC；没有 soundfile 时只能读 WAV，这两项功能直接关闭
+DECODE_AVAILABLE = NUMPY_AVAILABLE and SOUNDFILE_AVAILABLE
+DECODE_MISSING_TIP = "需要安装 numpy 与 soundfile"
+
 def resource_path(relative_path):
     if hasattr(sys, '_MEIPASS'):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
+def cache_path(*parts):
+    # 本地缓存目录（封面缩略图等），不存在时自动创建
+    folder = os.path.join(os.path.expanduser("~"), ".myplayer_cache", *parts)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def extract_cover_bytes(path):
+    # 取出内嵌封面的原始字节：ID3 APIC（mp3/wav）、FLAC PICTURE、MP4 covr，优先封面（type 3）
+    audio = mutagen.File(path)
+    if audio is None:
+        return None
+    pictures = getattr(audio, "pictures", None)
+    if pictures:
+        front = [pic for pic in pictures if pic.type == 3]
+        return (front or pictures)[0].data
+    tags = audio.tags
+    if not tags:
+        return None
+    if hasattr(tags, "getall"):
+        apic = tags.getall("APIC")
+        if apic:
+            front = [pic for pic in apic if pic.type == 3]
+            return (front or apic)[0].data
+        return None
+    covr = tags.get("covr") if hasattr(tags, "get") else None
+    if covr:
+        return bytes(covr[0])
+    return None
+
+def decode_cover_image(data, size):
+    # JPEG 使用 draft 模式按 1/2、1/4、1/8 缩小解码，大图不会完整解码；
+    # 像素直接交给 QImage，不再经过 PNG 编码再解码
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (size, size))
+    image = image.convert("RGBA").resize((size, size), Image.BILINEAR, reducing_gap=2.0)
+    raw = image.tobytes("raw", "RGBA")
+    qimage = QImage(raw, size, size, size * 4, QImage.Format_RGBA8888)
+    qimage.raw_buffer = raw  # QImage 不拥有这段内存，保持引用
+    return qimage
+
+def load_image_file(path, size):
+    with open(path, "rb") as f:
+        return decode_cover_image(f.read(), size)
+
+def load_cover_image(path, size):
+    try:
+        data = extract_cover_bytes(path)
+        if data:
+            return decode_cover_image(data, size)
+    except Exception:
+        pass
+    return None
+
+def benchmark_cover_decode(paths, size=200, rounds=3):
+    # 对比旧的 ID3 → PIL 全尺寸解码 → PNG 编码 → loadFromData 流程与新流程（单位：ms/张）
+    def legacy(path):
+        try:
+            for tag in ID3(path).values():
+                if tag.FrameID == "APIC":
+                    image = Image.open(io.BytesIO(tag.data)).resize((size, size))
+                    buf = io.BytesIO()
+                    image.save(buf, format='PNG')
+                    pixmap = QPixmap()
+                    pixmap.loadFromData(buf.getvalue())
+                    return pixmap
+        except Exception:
+            pass
+        return None
+
+    def current(path):
+        image = load_cover_image(path, size)
+        return QPixmap.fromImage(image) if image is not None else None
+
+    result = {}
+    for name, fn in (("legacy", legacy), ("scaled", current)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                fn(path)
+        elapsed = time.perf_counter() - start
+        result[name] = elapsed * 1000 / max(1, rounds * len(paths))
+    return result
+
+def dominant_color(image, sample=48):
+    # 在缩小后的封面上做 12 位量化直方图（按饱和度加权），取最大桶的平均色；
+    # 全部用 NumPy 向量化完成，可在工作线程调用。返回 (r, g, b) 或 None
+    img = image.convertToFormat(QImage.Format_RGBA8888).scaled(sample, sample)
+    w, h = img.width(), img.height()
+    ptr = img.constBits()
+    ptr.setsize(img.byteCount())
+    px = np.frombuffer(ptr, np.uint8).reshape(h, img.bytesPerLine())[:, :w * 4].reshape(-1, 4)
+    rgb = px[px[:, 3] > 0, :3].astype(np.int32)
+    if not len(rgb):
+        return None
+    mx = rgb.max(axis=1)
+    mn = rgb.min(axis=1)
+    # 排除接近纯黑 / 纯白的像素，避免背景色成为主色
+    keep = (mx > 40) & (mn < 230)
+    if keep.any():
+        rgb, mx, mn = rgb[keep], mx[keep], mn[keep]
+    weight = (mx - mn) / (mx + 1) + 0.05
+    codes = (rgb[:, 0] >> 4) << 8 | (rgb[:, 1] >> 4) << 4 | (rgb[:, 2] >> 4)
+    hist = np.bincount(codes, weights=weight, minlength=4096)
+    members = rgb[codes == int(hist.argmax())]
+    r, g, b = members.mean(axis=0)
+    return int(r), int(g), int(b)
+
 # 定义一个可拖动的 QTextBrowser 子类，非链接区域将传递事件给上层
 class DraggableTextBrowser(QTextBrowser):
     def mousePressEvent(self, event):
@@ -49,6 +184,267 @@ class DraggableTextBrowser(QTextBrowser):
         else:
             self.window().mouseReleaseEvent(event)
 
+# ========== 虚拟化主歌词面板 ==========
+class LyricView(QWidget):
+    # 只排版和绘制可见窗口内的歌词行，每行固定行高，滚动位置用属性动画平滑过渡；
+    # 开销与歌词总行数无关，几千行的长歌词也不会卡顿
+    lineClicked = pyqtSignal(float)  # 点击某行，参数为该行时间（秒）
+    userScrolled = pyqtSignal()      # 用户手动滚动
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.lines = []
+        self.current = -1
+        self._scroll = 0.0
+        self.press_y = None
+        self.dragging = False
+        self.setFont(QFont("微软雅黑", 12))
+        self.anim = QPropertyAnimation(self, b"scroll")
+        self.anim.setDuration(300)
+        self.anim.setEasingCurve(QEasingCurve.OutCubic)
+
+    def get_scroll(self):
+        return self._scroll
+
+    def set_scroll(self, value):
+        self._scroll = value
+        self.update()
+
+    scroll = pyqtProperty(float, get_scroll, set_scroll)
+
+    def line_height(self):
+        return int(QFontMetrics(self.font()).height() * 1.8)
+
+    def target_scroll(self, index):
+        lh = self.line_height()
+        return index * lh + lh / 2 - self.height() / 2
+
+    def clamp(self, value):
+        if not self.lines:
+            return 0.0
+        return max(self.target_scroll(0), min(self.target_scroll(len(self.lines) - 1), value))
+
+    def set_lines(self, lines):
+        self.anim.stop()
+        self.lines = lines
+        self.current = -1
+        self._scroll = self.clamp(0)
+        self.update()
+
+    def set_current(self, index, follow=True):
+        old = self.current
+        self.current = index
+        if follow:
+            self.scroll_to(index)
+        else:
+            # 锁定时只重绘新旧两行
+            lh = self.line_height()
+            for i in (old, index):
+                if i >= 0:
+                    self.update(QRect(0, int(i * lh - self._scroll), self.width(), lh))
+
+    def scroll_to(self, index, animated=True):
+        self.anim.stop()
+        target = self.clamp(self.target_scroll(index))
+        if not animated or abs(target - self._scroll) > self.height() * 3:
+            self.set_scroll(target)
+            return
+        self.anim.setStartValue(self._scroll)
+        self.anim.setEndValue(target)
+        self.anim.start()
+
+    def index_at(self, y):
+        i = int((y + self._scroll) // self.line_height())
+        return i if 0 <= i < len(self.lines) else -1
+
+    def paintEvent(self, event):
+        if not self.lines:
+            return
+        lh = self.line_height()
+        first = max(0, int(self._scroll // lh))
+        last = min(len(self.lines), int((self._scroll + self.height()) // lh) + 1)
+        normal = self.font()
+        bold = QFont(normal)
+        bold.setBold(True)
+        fm = QFontMetrics(normal)
+        w = self.width()
+        p = QPainter(self)
+        for i in range(first, last):
+            rect = QRect(0, int(i * lh - self._scroll), w, lh)
+            if i == self.current:
+                p.setFont(bold)
+                p.setPen(self.palette().color(QPalette.Link))
+            else:
+                p.setFont(normal)
+                p.setPen(QColor("gray"))
+            p.drawText(rect, Qt.AlignCenter, fm.elidedText(self.lines[i][1], Qt.ElideRight, w - 20))
+        p.end()
+
+    def wheelEvent(self, event):
+        self.anim.stop()
+        steps = event.angleDelta().y() / 120
+        self.set_scroll(self.clamp(self._scroll - steps * self.line_height() * 3))
+        self.userScrolled.emit()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.press_y = event.y()
+            self.dragging = False
+
+    def mouseMoveEvent(self, event):
+        if self.press_y is None:
+            return
+        dy = event.y() - self.press_y
+        if self.dragging or abs(dy) > 4:
+            if not self.dragging:
+                self.anim.stop()
+                self.dragging = True
+                self.userScrolled.emit()
+            self.set_scroll(self.clamp(self._scroll - dy))
+            self.press_y = event.y()
+
+    def mouseReleaseEvent(self, event):
+        if self.press_y is not None and not self.dragging:
+            i = self.index_at(event.y())
+            if i >= 0:
+                self.lineClicked.emit(self.lines[i][0])
+        self.press_y = None
+        self.dragging = False
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.current >= 0:
+            self.set_scroll(self.clamp(self.target_scroll(self.current)))
+
+# ========== 卡拉 OK 逐字高亮行 ==========
+class KaraokeLine(QWidget):
+    # 每行文字只排版一次并缓存为两张位图（底色 / 高亮色），
+    # 每帧只移动裁剪矩形并重绘变化的窄条，不做任何文字重排
+    FRAME_MS = 16
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.time_source = None
+        self.words = []
+        self.word_starts = []
+        self.texts = None
+        self.line_end = 0
+        self.base_pixmap = None
+        self.high_pixmap = None
+        self.word_x = []   # 每个片段在第一行中的起点与宽度（像素）
+        self.line_rect = QRect()
+        self.sweep_x = 0
+        self.line_font = QFont("微软雅黑")
+        self.line_font.setPixelSize(24)
+        self.line_font.setBold(True)
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+    def set_line(self, text, words, line_end, next_text=""):
+        self.words = words
+        self.word_starts = [t for t, _ in words]
+        self.line_end = line_end
+        self.texts = (text, next_text)
+        self._render(text, next_text)
+        self.sweep_x = -1
+        self.tick()
+        self.set_running(True)
+
+    def set_running(self, running):
+        if running and self.words and self.isVisible():
+            self.timer.start(self.FRAME_MS)
+        else:
+            self.timer.stop()
+
+    def _render(self, text, next_text):
+        fm = QFontMetrics(self.line_font)
+        line_h = fm.height()
+        lines = 2 if next_text else 1
+        w = max(1, self.width())
+        h = max(1, self.height())
+        text_w = fm.horizontalAdvance(text)
+        left = max(0, (w - text_w) // 2)
+        top = max(0, (h - line_h * lines) // 2)
+        self.line_rect = QRect(left, top, text_w, line_h)
+        self.word_x = []
+        x = left
+        for _, frag in self.words:
+            fw = fm.horizontalAdvance(frag)
+            self.word_x.append((x, fw))
+            x += fw
+        dpr = self.devicePixelRatioF()
+        pixmaps = []
+        for color in (QColor("white"), self.palette().color(QPalette.Link)):
+            pm = QPixmap(int(w * dpr), int(h * dpr))
+            pm.setDevicePixelRatio(dpr)
+            pm.fill(Qt.transparent)
+            p = QPainter(pm)
+            p.setFont(self.line_font)
+            p.setPen(color)
+            p.drawText(QRect(0, top, w, line_h), Qt.AlignCenter, text)
+            if next_text:
+                p.setPen(QColor("white"))
+                p.drawText(QRect(0, top + line_h, w, line_h), Qt.AlignCenter, next_text)
+            p.end()
+            pixmaps.append(pm)
+        self.base_pixmap, self.high_pixmap = pixmaps
+
+    def sweep_at(self, t):
+        if not self.words:
+            return 0
+        k = bisect.bisect_right(self.word_starts, t) - 1
+        if k < 0:
+            return self.line_rect.left()
+        x, fw = self.word_x[k]
+        start = self.words[k][0]
+        end = self.words[k + 1][0] if k + 1 < len(self.words) else self.line_end
+        frac = 1.0 if end <= start else min(1.0, (t - start) / (end - start))
+        return int(x + fw * frac)
+
+    def tick(self):
+        if self.time_source is None:
+            return
+        x = self.sweep_at(self.time_source())
+        if x == self.sweep_x:
+            return
+        old = self.sweep_x
+        self.sweep_x = x
+        r = self.line_rect
+        if old < 0:
+            self.update()
+        else:
+            lo, hi = min(old, x), max(old, x)
+            self.update(QRect(lo, r.top(), hi - lo + 1, r.height()))
+        if x >= r.right():
+            self.timer.stop()
+
+    def paintEvent(self, event):
+        if self.base_pixmap is None:
+            return
+        p = QPainter(self)
+        p.drawPixmap(0, 0, self.base_pixmap)
+        r = self.line_rect
+        p.setClipRect(QRect(0, r.top(), max(0, self.sweep_x), r.height()))
+        p.drawPixmap(0, 0, self.high_pixmap)
+        p.end()
+
+    def changeEvent(self, event):
+        # 强调色经调色板下发，变化时只重画当前行的两张缓存位图
+        if event.type() == QEvent.PaletteChange and self.texts is not None:
+            self._render(*self.texts)
+            self.update()
+        super().changeEvent(event)
+
+    def resync(self, running):
+        # 跳转后同一行内的扫动位置也要立即更新
+        self.tick()
+        self.set_running(running)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
 # ========== 悬浮歌词窗口类 ==========
 class LyricOverlay(QDialog):
     def __init__(self, parent=None):
@@ -95,6 +491,11 @@ class LyricOverlay(QDialog):
         self.browser.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.browser.setHtml("")
         frame_layout.addWidget(self.browser)
+        self.karaoke = KaraokeLine()
+        self.karaoke.hide()
+        frame_layout.addWidget(self.karaoke)
+        self.karaoke_line = None
+        self.plain_line = None
 
         # 添加阴影效果（默认关闭）
         self.shadow_effect = QGraphicsDropShadowEffect(self)
@@ -131,9 +532,35 @@ class LyricOverlay(QDialog):
 
         self.drag_pos = None
 
-    def update_lyric(self, html):
+    def update_lyric(self, current_line, next_line=None):
+        # 当前行用调色板的 Link 色，封面取色改变调色板时重新生成
+        if self.karaoke.isVisible():
+            self.karaoke.hide()
+            self.browser.show()
+        self.karaoke_line = None
+        self.plain_line = (current_line, next_line)
+        color = self.palette().color(QPalette.Link).name()
+        html = f'<span style="color:{color}; font-weight:bold;">{current_line}</span>'
+        if next_line is not None:
+            html += f'<br/>{next_line}'
         self.browser.setHtml(html)
 
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.PaletteChange and self.karaoke_line is None and self.plain_line is not None:
+            self.update_lyric(*self.plain_line)
+
+    def show_karaoke(self, text, words, line_end, next_text=""):
+        if self.browser.isVisible():
+            self.browser.hide()
+            self.karaoke.show()
+        self.karaoke_line = (text, words, line_end, next_text)
+        self.karaoke.set_line(text, words, line_end, next_text)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.karaoke.set_running(True)
+
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
             self.drag_pos = event.globalPos() - self.frameGeometry().topLeft()
@@ -165,11 +592,1664 @@ class LyricOverlay(QDialog):
         btn_size = 20
         margin = 5
         self.btn_close.setGeometry(self.frame.width() - btn_size - margin, margin, btn_size, btn_size)
+        # 尺寸变化时才重新排版缓存位图
+        if self.karaoke_line is not None:
+            QTimer.singleShot(0, lambda: self.karaoke_line and self.karaoke.set_line(*self.karaoke_line))
 
     def closeEvent(self, event):
         event.ignore()
         self.hide()
 
+# ========== 播放事件控制器 ==========
+class PlaybackEvents(QObject):
+    # 订阅 libvlc 事件管理器，把 VLC 线程里的回调通过队列信号转到 Qt 线程；
+    # 界面不再轮询 is_playing() / get_position() / get_state()
+    ended = pyqtSignal()
+    time_changed = pyqtSignal(float)      # 秒
+    position_changed = pyqtSignal(float)  # 0~1
+    playing = pyqtSignal()
+    paused = pyqtSignal()
+    error = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.source = None
+
+    def attach(self, player):
+        def only_source(emit):
+            return lambda e: emit(e) if self.source is player else None
+        em = player.event_manager()
+        em.event_attach(vlc.EventType.MediaPlayerEndReached, only_source(lambda e: self.ended.emit()))
+        em.event_attach(vlc.EventType.MediaPlayerTimeChanged,
+                        only_source(lambda e: self.time_changed.emit(e.u.new_time / 1000)))
+        em.event_attach(vlc.EventType.MediaPlayerPositionChanged,
+                        only_source(lambda e: self.position_changed.emit(e.u.new_position)))
+        em.event_attach(vlc.EventType.MediaPlayerPlaying, only_source(lambda e: self.playing.emit()))
+        em.event_attach(vlc.EventType.MediaPlayerPaused, only_source(lambda e: self.paused.emit()))
+        em.event_attach(vlc.EventType.MediaPlayerEncounteredError, only_source(lambda e: self.error.emit()))
+
+    def follow(self, player):
+        self.source = player
+
+# ========== 无缝播放引擎 ==========
+class GaplessEngine(QObject):
+    # 在当前曲目结束前预先解析下一首，并在备用播放器上静音起播后暂停在开头（预热），
+    # 到点时由精确定时器直接恢复备用播放器并交换两者，不再等 update_ui 发现 Ended
+    PRELOAD_SEC = 10      # 剩余多少秒时开始准备下一首
+    SWITCH_LEAD_MS = 30   # 提前多少毫秒恢复下一首，抵消音频输出的启动延迟
+    PRIME_TIMEOUT = 5.0
+    MAX_CROSSFADE = 12
+    FADE_STEP_MS = 20
+
+    switched = pyqtSignal(int)  # 已切换到的播放列表下标
+
+    def __init__(self, instance, player, clock, parent=None):
+        super().__init__(parent)
+        self.instance = instance
+        self.active = player
+        self.standby = instance.media_player_new()
+        self.clock = clock
+        self.volume = 80
+        self.rate = 1.0
+        self.next_index = None
+        self.primed = False
+        self.prime_started = 0.0
+        # 间隙按音频时间计算：各播放器最近一次 / 切换后第一次 TimeChanged 的 (媒体秒, 单调时钟)，VLC 线程写入
+        self.last_time = {}
+        self.first_time = {}
+        self.gap_probe = None  # (旧播放器, 旧曲目时长, 新播放器)
+        self.gaps_ms = []
+        self.preload_sec = self.PRELOAD_SEC
+        self.media_factory = instance.media_new
+        self.on_prepare = None  # (播放器, 路径) → 为备用播放器设置音量均衡等
+        self.crossfade = 0.0
+        self.fading = None    # 淡出中的旧播放器及淡入淡出开始时刻
+        clock.attach(self.standby)
+        for p in (self.active, self.standby):
+            em = p.event_manager()
+            em.event_attach(vlc.EventType.MediaPlayerTimeChanged,
+                            lambda e, p=p: self._on_time_changed(p, e.u.new_time / 1000))
+        self.prime_timer = QTimer(self)
+        self.prime_timer.timeout.connect(self._check_primed)
+        self.switch_timer = QTimer(self)
+        self.switch_timer.setSingleShot(True)
+        self.switch_timer.setTimerType(Qt.PreciseTimer)
+        self.switch_timer.timeout.connect(self.switch)
+        # 淡入淡出包络由独立的精确定时器驱动，与界面刷新无关
+        self.fade_timer = QTimer(self)
+        self.fade_timer.setTimerType(Qt.PreciseTimer)
+        self.fade_timer.timeout.connect(self._fade_step)
+
+    def set_crossfade(self, seconds):
+        self.crossfade = max(0.0, min(float(self.MAX_CROSSFADE), seconds))
+
+    def reset(self):
+        # 用户手动换歌、切换播放模式或修改列表时，已准备的下一首作废
+        self.finish_fade()
+        self.switch_timer.stop()
+        self.prime_timer.stop()
+        if self.next_index is not None:
+            self.standby.stop()
+        self.next_index = None
+        self.primed = False
+
+    def suspend(self):
+        # 暂停时不能按原计划切换，恢复播放后由下一次 poll 重新设定
+        self.switch_timer.stop()
+        self.finish_fade()
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.fading is None:
+            self.active.audio_set_volume(volume)
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+    def poll(self, cur_time, length, pick_next, path_of):
+        # 由界面刷新或跳转调用：临近结尾时准备下一首，并根据剩余时间重新设定切换定时器
+        if not length or not self.clock.playing or self.fading is not None:
+            self.switch_timer.stop()
+            return
+        remaining = length - cur_time
+        # 淡入淡出时下一首要提前开始，预加载也相应提前
+        if remaining > max(self.preload_sec, self.crossfade + 5):
+            if self.next_index is not None:
+                self.reset()
+            return
+        if self.next_index is None:
+            index = pick_next()
+            if index is None:
+                return
+            self.prepare(index, path_of(index))
+        if self.primed:
+            delay = int((remaining - self.crossfade) * 1000 / self.rate) - self.SWITCH_LEAD_MS
+            self.switch_timer.start(max(0, delay))
+
+    def prepare(self, index, path):
+        media = self.media_factory(path)
+        media.parse_with_options(vlc.MediaParseFlag.local, 2000)
+        self.standby.set_media(media)
+        if self.on_prepare is not None:
+            self.on_prepare(self.standby, path)
+        self.standby.audio_set_volume(0)
+        self.standby.play()
+        self.next_index = index
+        self.primed = False
+        self.prime_started = time.monotonic()
+        self.prime_timer.start(20)
+
+    def _check_primed(self):
+        state = self.standby.get_state()
+        if state == vlc.State.Playing:
+            self.standby.set_pause(1)
+            self.standby.set_time(0)
+            self.standby.set_rate(self.rate)
+            self.primed = True
+            self.prime_timer.stop()
+        elif state == vlc.State.Error or time.monotonic() - self.prime_started > self.PRIME_TIMEOUT:
+            print("预加载下一首失败，结束后按普通方式切换")
+            self.prime_timer.stop()
+            self.standby.stop()
+            self.next_index = None
+
+    def switch(self):
+        if not self.primed or self.next_index is None:
+            return
+        old, new = self.active, self.standby
+        new.audio_set_volume(0 if self.crossfade else self.volume)
+        self.first_time.pop(new, None)
+        self.gap_probe = (old, max(0, old.get_length()) / 1000, new)
+        new.set_pause(0)
+        self.active, self.standby = new, old
+        self.clock.reset()
+        self.clock.follow(new)
+        self.clock.length = max(0, new.get_length()) / 1000
+        self.clock.resume()
+        index = self.next_index
+        self.next_index = None
+        self.primed = False
+        if self.crossfade:
+            self.fading = (old, time.monotonic(), self.crossfade)
+            self.fade_timer.start(self.FADE_STEP_MS)
+        else:
+            # 让旧曲目自然播完最后几十毫秒再停止
+            QTimer.singleShot(300, old.stop)
+            QTimer.singleShot(1000, self._record_gap)
+        self.switched.emit(index)
+
+    def _fade_step(self):
+        # 等功率曲线：旧曲目 cos、新曲目 sin，两者功率之和保持不变
+        old, start, duration = self.fading
+        x = min(1.0, (time.monotonic() - start) / duration)
+        old.audio_set_volume(int(round(self.volume * math.cos(x * math.pi / 2))))
+        self.active.audio_set_volume(int(round(self.volume * math.sin(x * math.pi / 2))))
+        if x >= 1.0:
+            self.finish_fade()
+
+    def finish_fade(self):
+        if self.fading is None:
+            return
+        old = self.fading[0]
+        self.fading = None
+        self.fade_timer.stop()
+        old.stop()
+        self.active.audio_set_volume(self.volume)
+
+    def _on_time_changed(self, player, media_time):
+        if media_time <= 0:
+            return  # 停止 / 复位时的 0 不代表出声位置
+        now = time.monotonic()
+        self.last_time[player] = (media_time, now)
+        if player not in self.first_time:
+            self.first_time[player] = (media_time, now)
+
+    def _record_gap(self):
+        # 间隙 = 新曲目第 0 秒的出声时刻 - 旧曲目末尾的出声时刻，两者都由 TimeChanged 报告的
+        # 媒体时间外推得到（与切换定时器提前量无关）；负数表示有少量重叠
+        if self.gap_probe is None:
+            return
+        old, old_length, new = self.gap_probe
+        self.gap_probe = None
+        last, first = self.last_time.get(old), self.first_time.get(new)
+        if last is None or first is None or not old_length:
+            return
+        old_end = last[1] + (old_length - last[0]) / self.rate
+        new_start = first[1] - first[0] / self.rate
+        self.gaps_ms.append((new_start - old_end) * 1000)
+
+    def gap_stats_text(self):
+        if not self.gaps_ms:
+            return "无缝切换：暂无数据"
+        avg = sum(self.gaps_ms) / len(self.gaps_ms)
+        return f"无缝切换 {len(self.gaps_ms)} 次，平均间隙 {avg:.1f} ms，最大 {max(self.gaps_ms):.1f} ms"
+
+# ========== 拖动进度条时的实时跳转 ==========
+class SeekThrottle(QObject):
+    # 拖动中的 set_time 请求限速并合并：同时最多一个跳转在途，新目标只覆盖待发目标；
+    # VLC 报告的时间落到目标附近即视为生效，记录 发出 → 生效 的延迟
+    MIN_INTERVAL_MS = 80
+    TIMEOUT_MS = 400
+    TOLERANCE = 0.3  # 秒
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.player = None
+        self.pending = None     # 待发目标（秒）
+        self.in_flight = None   # (目标秒, 发出时刻)
+        self.last_issue = 0.0
+        self.latencies_ms = deque(maxlen=200)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._pump)
+
+    def request(self, player, target):
+        self.player = player
+        self.pending = target
+        self._pump()
+
+    def finish(self, player, target):
+        # 松开滑块：丢弃待发目标，立即精确跳到最终位置
+        self.timer.stop()
+        self.pending = None
+        self.player = player
+        self._issue(target)
+
+    def _issue(self, target):
+        now = time.perf_counter()
+        self.player.set_time(int(target * 1000))
+        self.in_flight = (target, now)
+        self.last_issue = now
+
+    def _pump(self):
+        if self.pending is None:
+            return
+        now = time.perf_counter()
+        if self.in_flight is not None:
+            waited = (now - self.in_flight[1]) * 1000
+            if waited < self.TIMEOUT_MS:
+                self.timer.start(int(self.TIMEOUT_MS - waited) + 1)
+                return
+            self.in_flight = None  # 超时未确认，不再等待
+        wait = self.MIN_INTERVAL_MS - (now - self.last_issue) * 1000
+        if wait > 0:
+            self.timer.start(int(wait) + 1)
+            return
+        target, self.pending = self.pending, None
+        self._issue(target)
+
+    def confirm(self, reported):
+        # 由 TimeChanged 事件调用（秒）
+        if self.in_flight is None or abs(reported - self.in_flight[0]) > self.TOLERANCE:
+            return
+        self.latencies_ms.append((time.perf_counter() - self.in_flight[1]) * 1000)
+        self.in_flight = None
+        self.timer.stop()
+        self._pump()
+
+    def stats_text(self):
+        if not self.latencies_ms:
+            return "拖动跳转：暂无数据"
+        ordered = sorted(self.latencies_ms)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return f"拖动跳转 {len(ordered)} 次，中位延迟 {ordered[len(ordered) // 2]:.0f} ms，P95 {p95:.0f} ms"
+
+# ========== 慢速存储：预读与内存媒体 ==========
+_io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="io-timeout")
+
+def run_with_timeout(fn, *args, timeout=0.2):
+    # 在 GUI 线程里做可能卡住的文件操作（如网络共享上的 stat）时使用：
+    # 超时就放弃等待并抛出 TimeoutError，卡住的只是后台线程
+    try:
+        return _io_executor.submit(fn, *args).result(timeout=timeout)
+    except FutureTimeout:
+        raise TimeoutError(f"I/O 超时：{fn.__name__}{args}")
+
+class ThrottledFile:
+    # 模拟慢速网络共享：每次读取先等待固定延迟，再按带宽限制速度
+    def __init__(self, f, latency, bytes_per_sec):
+        self.f = f
+        self.latency = latency
+        self.bytes_per_sec = bytes_per_sec
+
+    def readinto(self, buf):
+        time.sleep(self.latency)
+        n = self.f.readinto(buf)
+        if n and self.bytes_per_sec:
+            time.sleep(n / self.bytes_per_sec)
+        return n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
+
+def storage_opener():
+    # 环境变量 MYPLAYER_THROTTLE_IO="延迟毫秒,字节每秒" 可在本地模拟慢速存储
+    spec = os.environ.get("MYPLAYER_THROTTLE_IO")
+    if not spec:
+        return lambda path: open(path, "rb")
+    latency_ms, bps = (float(x) for x in spec.split(","))
+    return lambda path: ThrottledFile(open(path, "rb"), latency_ms / 1000, bps)
+
+# libvlc 回调媒体：打开时为每个流分配读取位置，数据直接从 bytearray 拷进 VLC 的缓冲区；
+# 流关闭时一并释放对数据的引用
+_memory_media = {}   # 媒体编号 → bytearray
+_memory_streams = {} # 流编号 → [bytearray, 数据地址, 位置, 媒体编号]
+_memory_ids = iter(range(1, 1 << 62))
+
+@vlc.CallbackDecorators.MediaOpenCb
+def _memory_open_cb(opaque, datap, sizep):
+    data = _memory_media.get(opaque)
+    if data is None:
+        return -1
+    stream_id = next(_memory_ids)
+    _memory_streams[stream_id] = [data, ctypes.addressof(ctypes.c_char.from_buffer(data)), 0, opaque]
+    datap.contents.value = stream_id
+    sizep.contents.value = len(data)
+    return 0
+
+@vlc.CallbackDecorators.MediaReadCb
+def _memory_read_cb(opaque, buf, length):
+    stream = _memory_streams.get(opaque)
+    if stream is None:
+        return -1
+    data, addr, pos, _ = stream
+    n = max(0, min(length, len(data) - pos))
+    ctypes.memmove(buf, addr + pos, n)
+    stream[2] = pos + n
+    return n
+
+@vlc.CallbackDecorators.MediaSeekCb
+def _memory_seek_cb(opaque, offset):
+    stream = _memory_streams.get(opaque)
+    if stream is None or offset > len(stream[0]):
+        return -1
+    stream[2] = offset
+    return 0
+
+@vlc.CallbackDecorators.MediaCloseCb
+def _memory_close_cb(opaque):
+    stream = _memory_streams.pop(opaque, None)
+    if stream is not None:
+        _memory_media.pop(stream[3], None)
+
+def memory_media(instance, data):
+    media_id = next(_memory_ids)
+    _memory_media[media_id] = data
+    return instance.media_new_callbacks(_memory_open_cb, _memory_read_cb, _memory_seek_cb,
+                                        _memory_close_cb, ctypes.c_void_p(media_id))
+
+class MediaReadAhead:
+    # 把即将播放的曲目整个读进内存 LRU（按字节预算淘汰），读取在后台线程分块进行，
+    # 超过期限就放弃；GUI 线程只做字典查询，永远不会等待网络共享
+    CHUNK = 1024 * 1024
+    DEADLINE = 60.0
+
+    def __init__(self, budget_bytes=256 * 1024 * 1024, opener=None):
+        self.budget = budget_bytes
+        self.used = 0
+        self.items = OrderedDict()
+        self.inflight = set()
+        self.lock = threading.Lock()
+        self.opener = opener or storage_opener()
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="read-ahead")
+
+    def get(self, path):
+        with self.lock:
+            data = self.items.get(path)
+            if data is not None:
+                self.items.move_to_end(path)
+            return data
+
+    def prefetch(self, paths):
+        for path in paths:
+            with self.lock:
+                if path in self.items or path in self.inflight:
+                    continue
+                self.inflight.add(path)
+            self.pool.submit(self._read, path)
+
+    def _read(self, path):
+        deadline = time.monotonic() + self.DEADLINE
+        try:
+            size = os.stat(path).st_size
+            if size > self.budget // 4:
+                return
+            data = bytearray(size)
+            view = memoryview(data)
+            pos = 0
+            with self.opener(path) as f:
+                while pos < size:
+                    if time.monotonic() > deadline:
+                        print("预读超时，放弃：", path)
+                        return
+                    n = f.readinto(view[pos:pos + self.CHUNK])
+                    if not n:
+                        break
+                    pos += n
+            del view
+            with self.lock:
+                self.items[path] = data
+                self.used += size
+                while self.used > self.budget and len(self.items) > 1:
+                    _, old = self.items.popitem(last=False)
+                    self.used -= len(old)
+        except OSError as e:
+            print("预读失败：", path, e)
+        finally:
+            with self.lock:
+                self.inflight.discard(path)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.used = 0
+
+# ========== PCM 解码管线 ==========
+# 所有离线分析（响度、波形……）共用：按固定帧数产出 float32 (frames, channels)，
+# 内存占用只与块大小有关。只接受路径参数，可直接在进程池的工作进程中构造
+PCM_READ_BLOCK = 65536
+
+def _wav_source(path):
+    # 没有 soundfile 时的退路：标准库 wave，支持 8/16/24/32 位整数 PCM
+    import wave
+    w = wave.open(path, "rb")
+    width, channels = w.getsampwidth(), w.getnchannels()
+    if width not in (1, 2, 3, 4):
+        w.close()
+        raise ValueError(f"不支持的 WAV 位深：{width * 8}")
+    def blocks():
+        with w:
+            while True:
+                raw = w.readframes(PCM_READ_BLOCK)
+                if not raw:
+                    break
+                if width == 1:
+                    data = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128) / 128
+                elif width == 3:
+                    b = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+                    v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+                    data = ((v ^ 0x800000) - 0x800000).astype(np.float32) / (1 << 23)
+                else:
+                    dtype = np.int16 if width == 2 else np.int32
+                    data = np.frombuffer(raw, dtype).astype(np.float32) / (1 << (width * 8 - 1))
+                yield data.reshape(-1, channels)
+    return w.getframerate(), channels, w.getnframes(), blocks()
+
+def _soundfile_source(path):
+    # libsndfile：WAV / FLAC / OGG，1.1 以后也支持 MP3
+    info = soundfile.info(path)
+    blocks = soundfile.blocks(path, blocksize=PCM_READ_BLOCK, dtype="float32", always_2d=True)
+    return info.samplerate, info.channels, info.frames, blocks
+
+class LinearResampler:
+    # 流式线性插值重采样，块与块之间保留一个采样和小数相位；精度足够做分析，不用于回放
+    def __init__(self, src_rate, dst_rate, channels):
+        self.step = src_rate / dst_rate
+        self.pos = 0.0
+        self.tail = np.zeros((0, channels), np.float32)
+
+    def process(self, block):
+        data = np.concatenate((self.tail, block)) if len(self.tail) else block
+        n = max(0, int(math.ceil((len(data) - 1 - self.pos) / self.step)))
+        if n == 0:
+            self.tail = data
+            return data[:0]
+        idx = self.pos + np.arange(n) * self.step
+        i0 = idx.astype(np.int64)
+        frac = (idx - i0).astype(np.float32)[:, None]
+        out = data[i0] * (1 - frac) + data[i0 + 1] * frac
+        end = self.pos + n * self.step
+        keep = int(end)
+        self.tail = data[keep:]
+        self.pos = end - keep
+        return out
+
+class PcmStream:
+    # 打开时只读格式信息；frames(size) 逐块解码、混缩 / 扩展声道、重采样并切成固定长度
+    def __init__(self, path, channels=None, rate=None):
+        self.path = path
+        opener = _soundfile_source if SOUNDFILE_AVAILABLE else _wav_source
+        self.source_rate, self.source_channels, self.source_frames, self._blocks = opener(path)
+        self.channels = channels or self.source_channels
+        self.rate = rate or self.source_rate
+        self.length = int(self.source_frames * self.rate / self.source_rate)  # 输出总帧数（估计）
+
+    def _remix(self, block):
+        if block.shape[1] == self.channels:
+            return block
+        if self.channels == 1:
+            return block.mean(axis=1, keepdims=True)
+        if block.shape[1] == 1:
+            return np.repeat(block, self.channels, axis=1)
+        return block[:, :self.channels]
+
+    def frames(self, size=4096):
+        # 最后一块可能不足 size 帧
+        resampler = None
+        if self.rate != self.source_rate:
+            resampler = LinearResampler(self.source_rate, self.rate, self.channels)
+        buf = np.empty((size, self.channels), np.float32)
+        filled = 0
+        for block in self._blocks:
+            block = self._remix(block)
+            if resampler is not None:
+                block = resampler.process(block)
+            while len(block):
+                take = min(size - filled, len(block))
+                buf[filled:filled + take] = block[:take]
+                filled += take
+                block = block[take:]
+                if filled == size:
+                    yield buf.copy()
+                    filled = 0
+        if filled:
+            yield buf[:filled].copy()
+
+def _decode_throughput(path):
+    # 进程池工作函数：返回 (音频秒数, 本进程 CPU 秒数)
+    start = time.process_time()
+    stream = PcmStream(path)
+    frames = sum(len(block) for block in stream.frames(16384))
+    return frames / stream.rate, time.process_time() - start
+
+def benchmark_decode(paths, workers=None):
+    # 解码吞吐：每核每秒能解出多少秒音频（音频总秒数 / 各进程 CPU 时间之和）
+    workers = workers or os.cpu_count() or 2
+    audio = cpu = 0.0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for future in as_completed([pool.submit(_decode_throughput, p) for p in paths]):
+            try:
+                sec, used = future.result()
+            except Exception as e:
+                print("解码失败：", e)
+                continue
+            audio += sec
+            cpu += used
+    wall = time.perf_counter() - start
+    return {"audio_sec": audio, "wall_sec": wall, "workers": workers,
+            "per_core": audio / cpu if cpu else 0.0, "total": audio / wall if wall else 0.0}
+
+# ========== 响度分析（EBU R128）与音量均衡 ==========
+LOUDNESS_TARGET = -18.0   # ReplayGain 2.0 参考响度（LUFS）
+LOUDNESS_HIST_MIN = -70.0 # 直方图下限（绝对门限）与精度 0.1 LU
+LOUDNESS_HIST_STEP = 0.1
+
+def k_weighting_power(rate, n):
+    # BS.1770 K 加权（高架 + 高通两个双二阶）在 rfft 频点上的功率响应 |H|²
+    def biquad(b, a, z):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    z = np.exp(-2j * np.pi * np.fft.rfftfreq(n))
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = biquad(((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+                   (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0), z)
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = biquad((1.0, -2.0, 1.0), (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0), z)
+    return np.abs(shelf * highpass) ** 2
+
+def true_peak_taps(ratio=4, taps=12):
+    # 4 倍过采样的多相插值滤波器（加窗 sinc），每相 taps 个系数
+    n = np.arange(-taps * ratio // 2, taps * ratio // 2) + 0.5
+    h = np.sinc(n / ratio) * np.hanning(len(n))
+    return [h[p::ratio] for p in range(ratio)]
+
+def fingerprint_file(path, sample=64 * 1024):
+    # 大小 + 首尾各 64KB 的摘要；改名或移动后仍能命中缓存
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(sample))
+        if size > sample * 2:
+            f.seek(-sample, os.SEEK_END)
+            digest.update(f.read(sample))
+    return digest.hexdigest()
+
+def analyze_loudness(path):
+    # 进程池中运行：100ms 子块经 rfft 得到 K 加权功率（Parseval），400ms 门限块取相邻 4 个子块均值；
+    # 返回 {指纹, 单曲响度, 真峰值, 响度直方图}，直方图用于合并计算专辑响度
+    fingerprint = fingerprint_file(path)
+    stream = PcmStream(path)
+    hop = stream.rate // 10
+    kpow = k_weighting_power(stream.rate, hop)
+    weights = np.array([1.0 if c < 3 else 1.41 for c in range(stream.channels)], np.float64)
+    powers = []
+    peak = 0.0
+    phases = true_peak_taps()
+    for block in stream.frames(hop * 50):
+        for phase in phases:
+            for c in range(block.shape[1]):
+                peak = max(peak, float(np.abs(np.convolve(block[:, c], phase, "same")).max(initial=0)))
+        peak = max(peak, float(np.abs(block).max(initial=0)))
+        usable = len(block) // hop * hop  # 只有最后一块会有不足 100ms 的尾巴
+        if not usable:
+            continue
+        sub = block[:usable].reshape(-1, hop, block.shape[1])
+        spectrum = np.abs(np.fft.rfft(sub, axis=1)) ** 2
+        # 单边谱换算回时域均方：除 n²，除直流 / 奈奎斯特外各频点乘 2
+        spectrum[:, 1:-1 if hop % 2 == 0 else None] *= 2
+        per_channel = (spectrum * kpow[None, :, None]).sum(axis=1) / (hop * hop)
+        powers.append(per_channel @ weights)
+    if not powers:
+        return {"fingerprint": fingerprint, "lufs": None, "peak": peak, "hist": {}}
+    sub_powers = np.concatenate(powers)
+    if len(sub_powers) < 4:
+        blocks = np.array([sub_powers.mean()])
+    else:
+        blocks = np.convolve(sub_powers, np.ones(4) / 4, "valid")
+    loudness = -0.691 + 10 * np.log10(np.maximum(blocks, 1e-12))
+    bins = np.floor((loudness[loudness > LOUDNESS_HIST_MIN] - LOUDNESS_HIST_MIN) / LOUDNESS_HIST_STEP)
+    values, counts = np.unique(bins.astype(np.int64), return_counts=True)
+    hist = {int(v): int(c) for v, c in zip(values, counts)}
+    return {"fingerprint": fingerprint, "lufs": integrated_loudness(hist), "peak": peak, "hist": hist}
+
+def integrated_loudness(hist):
+    # 从 0.1 LU 精度的直方图做 R128 门限：绝对 -70 LUFS，相对 -10 LU
+    if not hist:
+        return None
+    bins = np.array(sorted(hist), np.float64)
+    counts = np.array([hist[b] for b in sorted(hist)], np.float64)
+    levels = LOUDNESS_HIST_MIN + (bins + 0.5) * LOUDNESS_HIST_STEP
+    powers = 10 ** ((levels + 0.691) / 10)
+    gate = -0.691 + 10 * math.log10((powers * counts).sum() / counts.sum()) - 10
+    keep = levels > gate
+    if not keep.any():
+        return None
+    return -0.691 + 10 * math.log10((powers[keep] * counts[keep]).sum() / counts[keep].sum())
+
+class LoudnessSignals(QObject):
+    progress = pyqtSignal(int, int)  # 已完成, 总数；两者相等表示本轮结束（含只核对不分析的 0, 0）
+
+class LoudnessLibrary:
+    # 分析结果以追加方式写入 JSON Lines 日志，每行 [路径, 大小, 修改时间, 结果]，后写的行覆盖先写的；
+    # 结果为 null 表示解码失败，文件不变就不再重试；
+    # 按 路径 → (大小, 修改时间, 指纹) 判断是否已分析，不必读文件。失效行过多时整体重写一次。
+    # 核对文件（stat）、分析（进程池）、计算专辑响度都在后台线程完成，GUI 线程取增益只查字典
+    SAVE_EVERY = 50
+
+    def __init__(self, folder):
+        self.file = os.path.join(folder, "loudness.jsonl")
+        self.lock = threading.Lock()
+        self.tracks = {}   # 指纹 → 结果
+        self.paths = {}    # 路径 → [大小, 修改时间, 指纹]
+        self.failed = {}   # 路径 → [大小, 修改时间]，解码失败的曲目
+        self.valid = {}    # 路径 → 结果，仅含已核对过指纹的曲目
+        self.albums = {}   # 文件夹 → (响度, 峰值)
+        self.signals = LoudnessSignals()
+        self.running = False
+        self.queued = None  # 运行中收到的下一次请求 (路径列表, 是否分析)
+        self.unsaved = []
+        self.lines = 0
+        try:
+            with open(self.file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        path, size, mtime, result = json.loads(line)
+                    except ValueError:
+                        continue  # 上次写到一半被中断
+                    self.lines += 1
+                    if result is None:
+                        self.paths.pop(path, None)
+                        self.failed[path] = [size, mtime]
+                        continue
+                    self.failed.pop(path, None)
+                    # JSON 的键只能是字符串，还原成与新分析结果一致的整数键，合并直方图时才能相加
+                    result["hist"] = {int(b): c for b, c in result["hist"].items()}
+                    self.tracks[result["fingerprint"]] = result
+                    self.paths[path] = [size, mtime, result["fingerprint"]]
+        except OSError:
+            pass
+
+    def save(self):
+        with self.lock:
+            lines, self.unsaved = self.unsaved, []
+            if self.lines + len(lines) > 2 * (len(self.paths) + len(self.failed)) + self.SAVE_EVERY:
+                # 失效行太多，压缩成每个路径一行
+                lines = [[path, size, mtime, self.tracks[fp]]
+                         for path, (size, mtime, fp) in self.paths.items()]
+                lines += [[path, size, mtime, None] for path, (size, mtime) in self.failed.items()]
+                tmp = self.file + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(line) + "\n" for line in lines)
+                os.replace(tmp, self.file)
+                self.lines = len(lines)
+            elif lines:
+                with open(self.file, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(line) + "\n" for line in lines)
+                self.lines += len(lines)
+
+    def lookup(self, path):
+        # 只查已核对的结果，不访问文件系统，可在 GUI 线程调用
+        return self.valid.get(path)
+
+    def refresh(self, paths):
+        # 后台核对指纹并计算专辑响度，不做分析；加载播放列表后调用
+        self._start(paths, False)
+
+    def analyze(self, paths):
+        # 在后台线程里驱动进程池，不阻塞 GUI
+        self._start(paths, True)
+
+    def _start(self, paths, analyze):
+        paths = list(paths)
+        with self.lock:
+            if self.running:
+                analyze = analyze or (self.queued is not None and self.queued[1])
+                self.queued = (paths, analyze)
+                return
+            self.running = True
+        threading.Thread(target=self._run, args=(paths, analyze), daemon=True).start()
+
+    def _run(self, paths, analyze):
+        while True:
+            try:
+                self._pass(paths, analyze)
+            except Exception as e:
+                print("响度分析失败：", e)
+            with self.lock:
+                if self.queued is None:
+                    self.running = False
+                    return
+                paths, analyze = self.queued
+                self.queued = None
+
+    def _check(self, path, by_content=False):
+        # 按大小和修改时间核对缓存结果，更新 valid；返回结果，已记录为解码失败的返回 False，需要分析的返回 None。
+        # by_content 时对未知路径再算一次指纹（只读首尾 64KB），改名或移动过的曲目不必重新解码
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.valid.pop(path, None)
+            return None
+        entry = self.paths.get(path)
+        result = None
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            result = self.tracks.get(entry[2])
+        if result is None and self.failed.get(path) == [st.st_size, st.st_mtime_ns]:
+            self.valid.pop(path, None)
+            return False
+        if result is None and by_content and self.tracks:
+            try:
+                result = self.tracks.get(fingerprint_file(path))
+            except OSError:
+                pass
+            if result is not None:
+                with self.lock:
+                    self.paths[path] = [st.st_size, st.st_mtime_ns, result["fingerprint"]]
+                    self.failed.pop(path, None)
+                    self.unsaved.append([path, st.st_size, st.st_mtime_ns, result])
+        if result is None:
+            self.valid.pop(path, None)
+        else:
+            self.valid[path] = result
+        return result
+
+    def _pass(self, paths, analyze):
+        todo = [p for p in paths if self._check(p, analyze) is None]
+        self._update_albums(paths)
+        if self.unsaved:
+            self.save()
+        if not analyze or not todo:
+            self.signals.progress.emit(0, 0)
+            return
+        done = 0
+        try:
+            with ProcessPoolExecutor(max_workers=os.cpu_count() or 2) as pool:
+                futures = {pool.submit(analyze_loudness, p): p for p in todo}
+                for future in as_completed(futures):
+                    path = futures[future]
+                    done += 1
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print("响度分析失败：", path, e)
+                        result = None
+                    with self.lock:
+                        if result is None:
+                            self.paths.pop(path, None)
+                            self.failed[path] = [st.st_size, st.st_mtime_ns]
+                        else:
+                            self.tracks[result["fingerprint"]] = result
+                            self.paths[path] = [st.st_size, st.st_mtime_ns, result["fingerprint"]]
+                            self.failed.pop(path, None)
+                            self.valid[path] = result
+                        self.unsaved.append([path, st.st_size, st.st_mtime_ns, result])
+                    if done % self.SAVE_EVERY == 0:
+                        self.save()
+                    if done < len(todo):
+                        self.signals.progress.emit(done, len(todo))
+        finally:
+            self.save()
+        self._update_albums(paths)
+        self.signals.progress.emit(len(todo), len(todo))
+
+    def _update_albums(self, paths):
+        # 专辑响度 = 合并同一文件夹所有已分析曲目的直方图后再做门限；有曲目未分析则不计算
+        folders = {}
+        for path in paths:
+            folders.setdefault(os.path.dirname(path), []).append(path)
+        for folder, members in folders.items():
+            results = [self.valid.get(p) for p in members]
+            if None in results:
+                self.albums.pop(folder, None)
+                continue
+            merged = {}
+            for result in results:
+                for b, c in result["hist"].items():
+                    merged[b] = merged.get(b, 0) + c
+            self.albums[folder] = (integrated_loudness(merged),
+                                   max(r["peak"] for r in results))
+
+    def gain_db(self, path, mode):
+        # 返回应施加的增益（dB），保证真峰值不超过 -1 dBTP；只查内存中的结果
+        result = self.lookup(path)
+        if result is None or result["lufs"] is None:
+            return 0.0
+        lufs, peak = result["lufs"], result["peak"]
+        if mode == "album":
+            album = self.albums.get(os.path.dirname(path))
+            if album is not None and album[0] is not None:
+                lufs, peak = album
+        gain = LOUDNESS_TARGET - lufs
+        if peak > 0:
+            gain = min(gain, -1.0 - 20 * math.log10(peak))
+        return max(-20.0, min(20.0, gain))
+
+# ========== 频谱可视化 ==========
+class AudioTap:
+    # 旁路播放器：在同一 Instance 上静默解码当前曲目，PCM 经 audio 回调写入预分配的环形缓冲区。
+    # 主播放器的输出链路不经过这里，可视化跟不上时只会丢帧，不会让播放卡顿
+    RATE = 44100
+    SIZE = 1 << 14  # 单声道 int16 采样数，约 0.37 秒
+
+    def __init__(self, instance, make_media=None):
+        self.instance = instance
+        self.make_media = make_media or instance.media_new  # 路径 → Media，慢速存储模式下走预读缓存
+        self.player = instance.media_player_new()
+        self.ring = np.zeros(self.SIZE, np.int16)
+        self.addr = self.ring.ctypes.data
+        self.written = 0  # 累计写入的采样数；回调线程只写，工作线程只读
+        self._play_cb = vlc.CallbackDecorators.AudioPlayCb(self._on_play)
+        self.player.audio_set_callbacks(self._play_cb, None, None, None, None, None)
+        self.player.audio_set_format("S16N", self.RATE, 1)
+
+    def _on_play(self, opaque, samples, count, pts):
+        # VLC 音频线程：只做两次 memmove，不分配内存、不拿锁
+        skip = max(0, count - self.SIZE)
+        n = count - skip
+        src = samples + skip * 2
+        start = self.written % self.SIZE
+        first = min(n, self.SIZE - start)
+        ctypes.memmove(self.addr + start * 2, src, first * 2)
+        if n > first:
+            ctypes.memmove(self.addr, src + first * 2, (n - first) * 2)
+        self.written += count
+
+    def load(self, path, position):
+        media = self.make_media(path)
+        media.add_option(f":start-time={position:.3f}")
+        self.player.set_media(media)
+        self.player.play()
+
+    def latest(self, out):
+        # 把最近 len(out) 个采样拷进 out（预分配），返回当前写入计数
+        written = self.written
+        n = len(out)
+        end = written % self.SIZE
+        if end >= n:
+            np.copyto(out, self.ring[end - n:end], casting="unsafe")
+        else:
+            np.copyto(out[:n - end], self.ring[self.SIZE - (n - end):], casting="unsafe")
+            np.copyto(out[n - end:], self.ring[:end], casting="unsafe")
+        return written
+
+class SpectrumWorker(threading.Thread):
+    # 固定帧率的分析线程：加窗 FFT → 对数分布的频段；处理不过来时直接跳帧
+    FPS = 30
+    FFT_SIZE = 2048
+    BANDS = 48
+    SCOPE_POINTS = 256
+    DECAY = 0.85
+
+    def __init__(self, tap, on_frame):
+        super().__init__(daemon=True)
+        self.tap = tap
+        self.on_frame = on_frame
+        self.active = threading.Event()
+        self.pending = False  # 上一帧界面还没取走时不再发信号，避免事件队列积压
+        self.latest = None
+        self.frame = np.zeros(self.FFT_SIZE, np.float32)
+        self.window = np.hanning(self.FFT_SIZE).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.FFT_SIZE, 1 / AudioTap.RATE)
+        edges = np.geomspace(40, AudioTap.RATE / 2, self.BANDS + 1)
+        self.band_index = np.minimum(np.searchsorted(freqs, edges[:-1]), len(freqs) - 1)
+        self.bars = np.zeros(self.BANDS, np.float32)
+        self.last_written = -1
+
+    def run(self):
+        interval = 1 / self.FPS
+        next_at = time.perf_counter()
+        while True:
+            self.active.wait()
+            now = time.perf_counter()
+            if next_at > now:
+                time.sleep(next_at - now)
+            next_at = max(next_at + interval, time.perf_counter())
+            self.step()
+
+    def step(self):
+        written = self.tap.latest(self.frame)
+        if written == self.last_written:
+            # 暂停或缓冲中：柱子自然回落，落到底后不再刷新
+            if not self.bars.any():
+                return
+            self.bars *= self.DECAY
+            self.bars[self.bars < 1e-3] = 0
+        else:
+            self.last_written = written
+            self.frame *= 1 / 32768
+            spectrum = np.abs(np.fft.rfft(self.frame * self.window)) / (self.FFT_SIZE / 4)
+            bands = np.maximum.reduceat(spectrum, self.band_index)
+            level = np.clip((20 * np.log10(bands + 1e-9) + 60) / 60, 0, 1)
+            np.maximum(level, self.bars * self.DECAY, out=self.bars)
+        step = self.FFT_SIZE // self.SCOPE_POINTS
+        self.latest = (self.bars.copy(), self.frame[::step].copy())
+        if not self.pending:
+            self.pending = True
+            self.on_frame()
+
+class Visualizer(QObject):
+    # 只有在开启且面板可见、窗口未最小化时才解码和计算；关闭后旁路播放器停止，工作线程休眠
+    frameReady = pyqtSignal()
+
+    def __init__(self, instance, make_media=None, parent=None):
+        super().__init__(parent)
+        self.tap = AudioTap(instance, make_media)
+        self.worker = SpectrumWorker(self.tap, self.frameReady.emit)
+        self.worker.start()
+        self.active = False
+        self.path = None
+        self.loaded = False
+        self.rate = 1.0
+
+    def take_frame(self):
+        self.worker.pending = False
+        return self.worker.latest
+
+    def load(self, path, position=0.0):
+        self.path = path
+        self.loaded = False
+        if self.active:
+            self._start(position)
+
+    def _start(self, position):
+        self.tap.load(self.path, position)
+        self.tap.player.set_rate(self.rate)
+        self.loaded = True
+
+    def sync(self, position, playing):
+        if not self.active or not self.path:
+            return
+        if not self.loaded:
+            if playing:
+                self._start(position)
+            return
+        self.tap.player.set_time(int(position * 1000))
+        self.tap.player.set_pause(0 if playing else 1)
+
+    def set_rate(self, rate):
+        self.rate = rate
+        if self.loaded:
+            self.tap.player.set_rate(rate)
+
+    def set_active(self, active, position=0.0, playing=False):
+        if active == self.active:
+            return
+        self.active = active
+        if active:
+            self.worker.active.set()
+            self.sync(position, playing)
+        else:
+            self.worker.active.clear()
+            self.tap.player.stop()
+            self.loaded = False
+
+class SpectrumView(QWidget):
+    # 纯 QPainter 矩形绘制；点击在频谱 / 示波器之间切换
+    visibilityChanged = pyqtSignal(bool)
+
+    def __init__(self, visualizer, parent=None):
+        super().__init__(parent)
+        self.visualizer = visualizer
+        self.scope_mode = False
+        self.frame = None
+        self.setMinimumHeight(60)
+        visualizer.frameReady.connect(self.on_frame, Qt.QueuedConnection)
+
+    def on_frame(self):
+        self.frame = self.visualizer.take_frame()
+        self.update()
+
+    def mousePressEvent(self, event):
+        self.scope_mode = not self.scope_mode
+        self.update()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.visibilityChanged.emit(True)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.frame = None
+        self.visibilityChanged.emit(False)
+
+    def paintEvent(self, event):
+        if self.frame is None:
+            return
+        bars, wave = self.frame
+        painter = QPainter(self)
+        color = self.palette().color(QPalette.Link)
+        w, h = self.width(), self.height()
+        if self.scope_mode:
+            mid = h // 2
+            step = w / len(wave)
+            for i, v in enumerate(wave):
+                y = int(v * mid)
+                top = mid - max(y, 0)
+                painter.fillRect(int(i * step), top, max(1, int(step)), max(1, abs(y)), color)
+        else:
+            bar_w = w / len(bars)
+            for i, v in enumerate(bars):
+                bh = int(v * h)
+                if bh:
+                    painter.fillRect(int(i * bar_w) + 1, h - bh, max(1, int(bar_w) - 2), bh, color)
+        painter.end()
+
+# ========== 波形进度条 ==========
+WAVEFORM_BUCKETS = 1000  # 与进度条 0–1000 的刻度一致
+
+def compute_waveform(path, buckets=WAVEFORM_BUCKETS, cancelled=None):
+    # 流式解码，按采样位置归入各桶后用 reduceat 求每桶最小 / 最大值；
+    # 结果量化为 uint8（128 为零点），每首歌只占 2×buckets 字节。cancelled() 为真时在下一块处放弃，返回 None
+    stream = PcmStream(path, channels=1)
+    total = stream.length
+    if total <= 0:
+        return None
+    lo = np.zeros(buckets, np.float32)
+    hi = np.zeros(buckets, np.float32)
+    pos = 0
+    for block in stream.frames(65536):
+        if cancelled is not None and cancelled():
+            return None
+        mono = block[:, 0]
+        ids = (np.arange(pos, pos + len(mono), dtype=np.int64) * buckets) // total
+        ids = np.minimum(ids, buckets - 1)  # 帧数是估计值，末尾多出的并入最后一桶
+        pos += len(mono)
+        starts = np.flatnonzero(np.diff(ids)) + 1
+        starts = np.concatenate(([0], starts))
+        np.minimum.at(lo, ids[starts], np.minimum.reduceat(mono, starts))
+        np.maximum.at(hi, ids[starts], np.maximum.reduceat(mono, starts))
+    def quantize(v):
+        return np.clip(np.round((v + 1) * 127.5), 0, 255).astype(np.uint8)
+    return quantize(lo), quantize(hi)
+
+class WaveformCache:
+    # 磁盘缓存，以 路径 + 修改时间 为键，文件内容为 lo 与 hi 两段 uint8
+    def __init__(self, folder):
+        self.folder = folder
+
+    def key(self, path):
+        st = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def load(self, path, cancelled=None):
+        # 工作线程调用：命中直接读盘，否则解码计算后写入
+        file = os.path.join(self.folder, self.key(path) + ".wf")
+        try:
+            with open(file, "rb") as f:
+                data = np.frombuffer(f.read(), np.uint8)
+            if len(data) == 0:
+                return None  # 之前解码失败，文件未变就不再重试
+            if len(data) == WAVEFORM_BUCKETS * 2:
+                return data[:WAVEFORM_BUCKETS], data[WAVEFORM_BUCKETS:]
+        except OSError:
+            pass
+        try:
+            peaks = compute_waveform(path, cancelled=cancelled)
+        except Exception:
+            open(file, "wb").close()  # 空文件记为失败
+            raise
+        if peaks is not None:
+            with open(file, "wb") as f:
+                f.write(peaks[0].tobytes() + peaks[1].tobytes())
+        return peaks
+
+class WaveformSlider(QSlider):
+    # 有波形数据时自绘：包络只在尺寸、调色板或数据变化时画进两张位图（未播放 / 已播放），
+    # 进度变化时只重绘新旧播放头之间的窄条；没有数据时退回普通 QSlider 外观
+    def __init__(self, parent=None):
+        super().__init__(Qt.Horizontal, parent)
+        self.peaks = None
+        self.base_pixmap = None
+        self.played_pixmap = None
+        self.head_x = 0
+
+    def set_peaks(self, peaks):
+        self.peaks = peaks
+        self.base_pixmap = None
+        self.setMinimumHeight(40 if peaks is not None else 0)
+        self.update()
+
+    def value_x(self, value):
+        span = self.maximum() - self.minimum()
+        return int((value - self.minimum()) / span * self.width()) if span else 0
+
+    def sliderChange(self, change):
+        if change != QSlider.SliderValueChange or self.peaks is None:
+            super().sliderChange(change)
+            return
+        x = self.value_x(self.value())
+        left = min(x, self.head_x) - 2
+        self.update(QRect(left, 0, abs(x - self.head_x) + 5, self.height()))
+        self.head_x = x
+
+    def _render(self):
+        lo, hi = self.peaks
+        w, h = max(1, self.width()), max(1, self.height())
+        # 每个像素列取对应桶范围内的最小 / 最大值
+        edges = np.minimum((np.arange(w) * len(lo)) // w, len(lo) - 1)
+        col_lo = np.minimum.reduceat(lo, edges).astype(np.int32)
+        col_hi = np.maximum.reduceat(hi, edges).astype(np.int32)
+        tops = h - 1 - col_hi * (h - 1) // 255
+        heights = np.maximum(1, (col_hi - col_lo) * (h - 1) // 255)
+        dpr = self.devicePixelRatioF()
+        text = self.palette().color(QPalette.WindowText)
+        faded = QColor(text)
+        faded.setAlpha(90)
+        pixmaps = []
+        for color in (faded, self.palette().color(QPalette.Link)):
+            pm = QPixmap(int(w * dpr), int(h * dpr))
+            pm.setDevicePixelRatio(dpr)
+            pm.fill(Qt.transparent)
+            painter = QPainter(pm)
+            for x, (top, height) in enumerate(zip(tops.tolist(), heights.tolist())):
+                painter.fillRect(x, top, 1, height, color)
+            painter.end()
+            pixmaps.append(pm)
+        self.base_pixmap, self.played_pixmap = pixmaps
+
+    def paintEvent(self, event):
+        if self.peaks is None:
+            super().paintEvent(event)
+            return
+        if self.base_pixmap is None:
+            self._render()
+        self.head_x = self.value_x(self.value())
+        painter = QPainter(self)
+        painter.setClipRect(event.rect())
+        painter.drawPixmap(0, 0, self.base_pixmap)
+        painter.setClipRect(event.rect().intersected(QRect(0, 0, self.head_x, self.height())))
+        painter.drawPixmap(0, 0, self.played_pixmap)
+        painter.setClipRect(event.rect())
+        painter.fillRect(self.head_x - 1, 0, 2, self.height(), self.palette().color(QPalette.Link))
+        painter.end()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.base_pixmap = None
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.PaletteChange:
+            self.base_pixmap = None
+            self.update()
+
+    def _value_at(self, x):
+        span = self.maximum() - self.minimum()
+        return self.minimum() + int(max(0, min(x, self.width())) / max(1, self.width()) * span)
+
+    def mousePressEvent(self, event):
+        # 波形上任意位置按下即开始拖动（发出 sliderPressed / sliderReleased，与原进度条一致）
+        if self.peaks is None or event.button() != Qt.LeftButton:
+            super().mousePressEvent(event)
+            return
+        self.setSliderDown(True)
+        self.setSliderPosition(self._value_at(event.x()))
+
+    def mouseMoveEvent(self, event):
+        if self.peaks is None or not self.isSliderDown():
+            super().mouseMoveEvent(event)
+            return
+        self.setSliderPosition(self._value_at(event.x()))
+
+    def mouseReleaseEvent(self, event):
+        if self.peaks is None or not self.isSliderDown():
+            super().mouseReleaseEvent(event)
+            return
+        self.setSliderPosition(self._value_at(event.x()))
+        self.setSliderDown(False)
+
+# ========== 歌词定时调度器 ==========
+class LyricScheduler:
+    # 不再依赖界面刷新定时器轮询歌词：根据当前播放时间和排好序的时间戳，
+    # 只为"下一行歌词的边界"设置一个单次定时器，两行之间几乎没有唤醒
+    def __init__(self, time_source, callback):
+        self.time_source = time_source  # 返回当前播放时间（秒）
+        self.callback = callback        # 当前行变化时回调，参数为行号
+        self.times = []
+        self.rate = 1.0
+        self.index = -1
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self._on_timeout)
+
+    def set_times(self, times):
+        self.timer.stop()
+        self.times = list(times)
+        self.index = -1
+
+    def set_rate(self, rate, cur_time, playing=True):
+        self.rate = rate if rate > 0 else 1.0
+        self.sync(cur_time, playing)
+
+    def line_at(self, cur_time):
+        return max(0, bisect.bisect_right(self.times, cur_time) - 1)
+
+    def sync(self, cur_time, playing=True):
+        # 定位当前行；在跳转、暂停、倍速变化后调用以重新设定定时器
+        self.timer.stop()
+        if not self.times:
+            return
+        index = self.line_at(cur_time)
+        if index != self.index:
+            self.index = index
+            self.callback(index)
+        if not playing or index + 1 >= len(self.times):
+            return
+        delay = (self.times[index + 1] - cur_time) / self.rate
+        # 多等 1ms，保证定时器触发时已越过边界
+        self.timer.start(max(0, int(delay * 1000)) + 1)
+
+    def stop(self):
+        self.timer.stop()
+
+    def _on_timeout(self):
+        self.sync(self.time_source())
+
+# ========== 封面缩略图缓存 ==========
+class CoverCache:
+    # 内存中保存最近使用的 QPixmap（LRU），磁盘上保存缩放好的缩略图，
+    # 以 路径 + 尺寸 + 修改时间 为键；命中时完全不需要打开音频文件
+    def __init__(self, folder, capacity=64):
+        self.folder = folder
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self.aliases = {}  # 曲目键 → 实际图片键（同一专辑共用文件夹封面）
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.decode_time = 0.0
+
+    def key(self, path, size):
+        st = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{size}|{st.st_mtime_ns}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        # 仅查内存，GUI 线程调用；返回 (是否命中, QPixmap 或 None)
+        key = self.aliases.get(key, key)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return True, self.memory[key]
+        return False, None
+
+    def alias(self, track_key, image_key):
+        if len(self.aliases) > 4096:
+            self.aliases.clear()
+        self.aliases[track_key] = image_key
+
+    def load_track_cover(self, track_key, path, size, folder_art):
+        # 工作线程：先找内嵌封面，没有再退回到文件夹封面；
+        # 文件夹封面以图片文件自身为键，同一专辑的曲目共用同一张缩略图。
+        # 返回 (曲目键, 图片键, QImage)，图片已在内存中时 QImage 为 None
+        if track_key is None:
+            track_key = self.key(path, size)
+        image = self.load_image(track_key, path, size, load_cover_image)
+        if image is not None:
+            return track_key, track_key, image
+        art = folder_art.find(os.path.dirname(path))
+        if art is None:
+            return track_key, track_key, None
+        art_key = self.key(art, size)
+        if art_key in self.memory:
+            return track_key, art_key, None
+        return track_key, art_key, self.load_image(art_key, art, size, load_image_file)
+
+    def load_image(self, key, path, size, loader):
+        # 查磁盘或解码，可在工作线程调用；loader(path, size) 返回 QImage 或 None（无封面）
+        png = os.path.join(self.folder, key + ".png")
+        none = os.path.join(self.folder, key + ".none")
+        if os.path.exists(png):
+            image = QImage(png)
+            if not image.isNull():
+                self.disk_hits += 1
+                return image
+        elif os.path.exists(none):
+            self.disk_hits += 1
+            return None
+        self.misses += 1
+        start = time.perf_counter()
+        image = loader(path, size)
+        self.decode_time += time.perf_counter() - start
+        try:
+            if image is not None:
+                image.save(png, "PNG")
+            else:
+                open(none, "wb").close()
+        except OSError as e:
+            print("写入封面缓存失败：", e)
+        return image
+
+    def put(self, key, pixmap):
+        self._put(key, pixmap)
+
+    def _put(self, key, pixmap):
+        self.memory[key] = pixmap
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "requests": total,
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+            "avg_decode_ms": self.decode_time * 1000 / self.misses if self.misses else 0.0,
+        }
+
+    def stats_text(self):
+        st = self.stats()
+        return (f"请求 {st['requests']} 次，命中率 {st['hit_rate']:.0%}"
+                f"（内存 {st['memory_hits']} / 磁盘 {st['disk_hits']}），"
+                f"解码 {st['misses']} 次，平均 {st['avg_decode_ms']:.1f} ms")
+
+# ========== 文件夹封面索引 ==========
+class FolderArtIndex:
+    # 每个目录只解析一次 cover.jpg / folder.jpg 等文件，按目录修改时间失效
+    NAMES = ("cover", "folder", "front", "album", "albumart")
+    EXTS = (".jpg", ".jpeg", ".png")
+
+    def __init__(self):
+        self.dirs = {}
+
+    def find(self, folder):
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+        cached = self.dirs.get(folder)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        candidates = {}
+        try:
+            for entry in os.scandir(folder):
+                stem, ext = os.path.splitext(entry.name.lower())
+                if ext in self.EXTS and stem in self.NAMES and entry.is_file():
+                    candidates.setdefault(stem, entry.path)
+        except OSError:
+            return None
+        art = next((candidates[n] for n in self.NAMES if n in candidates), None)
+        self.dirs[folder] = (mtime, art)
+        return art
+
+# ========== 后台曲目加载任务 ==========
+class TrackLoadSignals(QObject):
+    # 工作线程发出，经队列连接回到 GUI 线程：(代号, 阶段, 结果)
+    loaded = pyqtSignal(int, str, object)
+
+class TrackLoadTask(QRunnable):
+    # 每个任务携带曲目代号；开始前和完成后都与当前代号比对，过期就直接丢弃
+    def __init__(self, signals, generation, current_generation, stage, fn, *args):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.current_generation = current_generation
+        self.stage = stage
+        self.fn = fn
+        self.args = args
+
+    def run(self):
+        if self.current_generation() != self.generation:
+            return
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            print(f"后台加载失败（{self.stage}）：", e)
+            result = None
+        if self.current_generation() != self.generation:
+            return
+        self.signals.loaded.emit(self.generation, self.stage, result)
+
+# ========== 专辑网格视图 ==========
+class PixmapLRU:
+    # 按字节预算淘汰的 QPixmap LRU，滚动多远内存都保持平稳
+    def __init__(self, budget_bytes):
+        self.budget = budget_bytes
+        self.used = 0
+        self.items = OrderedDict()
+
+    @staticmethod
+    def cost(pixmap):
+        if pixmap is None:
+            return 64
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key][0]
+
+    def put(self, key, pixmap):
+        if key in self.items:
+            self.used -= self.items.pop(key)[1]
+        cost = self.cost(pixmap)
+        self.items[key] = (pixmap, cost)
+        self.used += cost
+        while self.used > self.budget and len(self.items) > 1:
+            _, (_, old_cost) = self.items.popitem(last=False)
+            self.used -= old_cost
+
+    def clear(self):
+        self.items.clear()
+        self.used = 0
+
+class AlbumGridModel(QAbstractListModel):
+    # 以文件夹为专辑分组；缩略图只为视口及其附近的格子在后台线程池中解码
+    THUMB_SIZE = 120
+    PREFETCH_ROWS = 2
+
+    def __init__(self, cover_cache, folder_art, parent=None):
+        super().__init__(parent)
+        self.cover_cache = cover_cache
+        self.folder_art = folder_art
+        self.albums = []   # [(文件夹, 显示名, [播放列表下标])]
+        self.paths = []
+        self.thumbs = PixmapLRU(32 * 1024 * 1024)
+        self.pending = set()
+        self.window = (0, -1)
+        self.generation = 0
+        self.placeholder = None
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = TrackLoadSignals()
+        self.signals.loaded.connect(self.on_thumb_loaded)
+
+    def set_albums(self, playlist):
+        self.beginResetModel()
+        groups = OrderedDict()
+        for i, path in enumerate(playlist):
+            groups.setdefault(os.path.dirname(path), []).append(i)
+        self.albums = [(folder, os.path.basename(folder) or folder, rows)
+                       for folder, rows in groups.items()]
+        self.paths = list(playlist)
+        self.generation += 1
+        self.pool.clear()
+        self.pending.clear()
+        self.thumbs.clear()
+        self.window = (0, -1)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.albums)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        folder, name, rows = self.albums[index.row()]
+        if role == Qt.DisplayRole:
+            return name
+        if role == Qt.ToolTipRole:
+            return f"{folder}（{len(rows)} 首）"
+        if role == Qt.DecorationRole:
+            pixmap = self.thumbs.get(folder)
+            return pixmap if pixmap is not None else self.placeholder_pixmap()
+        return None
+
+    def placeholder_pixmap(self):
+        if self.placeholder is None:
+            self.placeholder = QPixmap(self.THUMB_SIZE, self.THUMB_SIZE)
+            self.placeholder.fill(QColor("#cccccc"))
+        return self.placeholder
+
+    def current_generation(self):
+        return self.generation
+
+    def set_window(self, first, last):
+        self.window = (first, last)
+        for row in range(first, last + 1):
+            folder = self.albums[row][0]
+            if folder in self.thumbs or row in self.pending:
+                continue
+            self.pending.add(row)
+            self.pool.start(TrackLoadTask(self.signals, self.generation, self.current_generation,
+                                          "thumb", self.load_thumb, row))
+
+    def load_thumb(self, row):
+        # 工作线程：已滚出窗口的请求直接放弃，不做解码
+        first, last = self.window
+        if not first <= row <= last:
+            return row, None, False
+        folder, _, rows = self.albums[row]
+        path = self.paths[rows[0]]
+        try:
+            key = self.cover_cache.key(path, self.THUMB_SIZE)
+        except OSError:
+            return row, None, True
+        _, _, image = self.cover_cache.load_track_cover(key, path, self.THUMB_SIZE, self.folder_art)
+        return row, image, True
+
+    def on_thumb_loaded(self, generation, stage, result):
+        if generation != self.generation or not result:
+            return
+        row, image, done = result
+        self.pending.discard(row)
+        if not done:
+            return
+        folder = self.albums[row][0]
+        self.thumbs.put(folder, QPixmap.fromImage(image) if image is not None else None)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+class AlbumGridView(QListView):
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setViewMode(QListView.IconMode)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(200)
+        self.setWordWrap(True)
+        size = AlbumGridModel.THUMB_SIZE
+        self.setIconSize(QSize(size, size))
+        self.setGridSize(QSize(size + 20, size + 40))
+        self.setVerticalScrollMode(QListView.ScrollPerPixel)  # 滚动条数值按像素计，可见行由它直接算出
+        # 滚动时合并请求，停顿 50ms 后再计算可见窗口
+        self.window_timer = QTimer(self)
+        self.window_timer.setSingleShot(True)
+        self.window_timer.timeout.connect(self.update_window)
+        self.verticalScrollBar().valueChanged.connect(lambda: self.window_timer.start(50))
+
+    def update_window(self):
+        model = self.model()
+        count = model.rowCount()
+        if not count or not self.isVisible():
+            return
+        # 统一格子尺寸、从左到右排布：由滚动位置、格高和列数算出可见行，
+        # 不用 indexAt 探测（Adjust 模式下右侧空白处探不到项目）
+        rect = self.viewport().rect()
+        grid = self.gridSize()
+        cols = max(1, rect.width() // grid.width())
+        top = self.verticalScrollBar().value()
+        first_row = top // grid.height()
+        last_row = (top + rect.height() - 1) // grid.height()
+        first = first_row * cols
+        last = (last_row + 1) * cols - 1
+        margin = cols * AlbumGridModel.PREFETCH_ROWS
+        model.set_window(max(0, min(count - 1, first - margin)), min(count - 1, last + margin))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.window_timer.start(0)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.window_timer.start(50)
+
+# ========== 本地控制接口（界面线程桥接） ==========
+class ControlBridge(QObject):
+    # ControlServer 在自己的线程里收到请求，经队列信号转到界面线程执行，结果通过 Future 返回
+    invoke = pyqtSignal(object, str, object)
+
+    def __init__(self, execute, parent=None):
+        super().__init__(parent)
+        self.execute = execute
+        self.invoke.connect(self._run, Qt.QueuedConnection)
+
+    def request(self, cmd, args):
+        future = Future()
+        self.invoke.emit(future, cmd, args)
+        return future
+
+    def _run(self, future, cmd, args):
+        try:
+            future.set_result(self.execute(cmd, args))
+        except Exception as e:
+            future.set_exception(e)
+
 # ========== 可拖拽播放列表控件 ==========
 class DraggableListWidget(QListWidget):
     def __init__(self, parent=None):
@@ -184,8 +2264,10 @@ class DraggableListWidget(QListWidget):
                 stylesheet = f.read()
             self.setStyleSheet(stylesheet)
 
+PLAYBACK_RATES = [0.75, 1.0, 1.25, 1.5, 2.0]
+
 # ========== 主播放器类 ==========
-class MusicPlayer(QWidget):
+class MusicPlayer(PlaylistLogic, QWidget):
     def __init__(self):
         super().__init__()
         self.settings = QSettings("MyPlayer", "MainWindow")
@@ -193,15 +2275,46 @@ class MusicPlayer(QWidget):
         self.setGeometry(200, 100, 960, 640)
         self.setWindowIcon(QIcon(resource_path("player_icon.ico")))
 
-        self.instance = vlc.Instance()
+        # 环境变量 MYPLAYER_VLC_PROFILE 优先于设置，便于在部署机上统一指定
+        self.vlc_profile = os.environ.get("MYPLAYER_VLC_PROFILE") or self.settings.value("vlc_profile", "default")
+        self.instance = create_vlc_instance(self.vlc_profile)
         self.player = self.instance.media_player_new()
+        self.clock = PlaybackClock()
+        self.clock.attach(self.player)
+        self.clock.follow(self.player)
+        self.gapless = GaplessEngine(self.instance, self.player, self.clock, self)
+        self.gapless.switched.connect(self.on_gapless_switched)
+        self.gapless.media_factory = self.make_media
+        self.gapless.on_prepare = self.apply_loudness_gain
+        self.playback_events = PlaybackEvents(self)
+        self.playback_events.attach(self.player)
+        self.playback_events.attach(self.gapless.standby)
+        self.playback_events.follow(self.player)
+        self.seek_throttle = SeekThrottle(self)
+        self.control_bridge = ControlBridge(self.control_command, self)
+        self.control_server = None
+        self.last_position_push = 0.0
+        self.last_lyric_push = -1
         self.playlist = []
         self.current_index = -1
         self.duration = 0
         self.user_seeking = False
         self.lyrics = []
+        self.lyric_words = []
         self.play_mode = "loop_all"
         self.playlist_visible = True
+        self.album_mode = False
+        self.accent_cache = {}  # 专辑文件夹 → 封面主色
+        self.pending_restore = None
+        self.shuffle = ShuffleEngine()
+        self.play_queue = deque()  # 待播队列（曲目路径），优先于播放列表和播放模式
+        self.read_ahead = MediaReadAhead()
+        self.loudness = LoudnessLibrary(cache_path("loudness"))
+        self.loudness_mode = self.settings.value("loudness_mode", "off") if DECODE_AVAILABLE else "off"
+        self.visualizer = Visualizer(self.instance, self.make_media, self) if NUMPY_AVAILABLE else None
+        self.waveform_cache = WaveformCache(cache_path("waveform"))
+        self._path_index = None
+        self.current_path = None
         self.is_dark = False
         self.lyric_locked = False
         self.double_line_mode = False
@@ -215,8 +2328,24 @@ class MusicPlayer(QWidget):
             except:
                 PYCAW_AVAILABLE = False
 
+        self.cover_cache = CoverCache(cache_path("covers"))
+        self.folder_art = FolderArtIndex()
+        self.load_pool = QThreadPool()
+        self.load_pool.setMaxThreadCount(2)
+        self.load_generation = 0
+        self.waveform_pool = QThreadPool()  # 波形解码耗时长，单独一个线程，不占上面两个
+        self.waveform_pool.setMaxThreadCount(1)
+        self.track_loader = TrackLoadSignals()
+        self.track_loader.loaded.connect(self.on_track_loaded)
         self.lyric_overlay = LyricOverlay()
+        # 当前歌词的高亮色放在调色板的 Link 角色里，封面取色只改调色板，不重新解析样式表
+        self.base_palette = QPalette(self.palette())
+        self.base_palette.setColor(QPalette.Link, QColor("red"))
+        self.setPalette(self.base_palette)
+        self.lyric_overlay.setPalette(self.base_palette)
         self.lyric_overlay.show()
+        self.lyric_scheduler = LyricScheduler(self.current_play_time, self.render_lyrics)
+        self.lyric_overlay.karaoke.time_source = self.clock.now
 
         self.init_ui()
 
@@ -231,63 +2360,51 @@ class MusicPlayer(QWidget):
         self.btn_settings.clicked.connect(self.toggle_settings_menu)
         self.btn_theme.clicked.connect(self.theme_button_clicked)
 
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_ui)
-        self.timer.start(1000)
+        events = self.playback_events
+        events.time_changed.connect(self.update_ui, Qt.QueuedConnection)
+        events.ended.connect(self.on_track_ended, Qt.QueuedConnection)
+        events.playing.connect(self.on_playing, Qt.QueuedConnection)
+        events.paused.connect(self.on_paused, Qt.QueuedConnection)
+        events.error.connect(self.on_playback_error, Qt.QueuedConnection)
 
-        self.load_saved_playlist()
-        self.restoring = False
+        self.restore()
 
         default_dir = "C:/PlayMc"
         if not self.playlist and os.path.exists(default_dir):
-            self.load_music_files(default_dir)
+            self.load_folder(default_dir)
 
         self.init_tray_icon()
 
-    def seek_to_lyric_time(self, url):
+    def seek_to(self, time_sec):
         try:
-            time_sec = float(url.toString())
             self.player.set_time(int(time_sec * 1000))
+            self.clock.seek(time_sec)
+            self.lyric_scheduler.sync(time_sec, self.clock.playing)
+            if self.visualizer is not None:
+                self.visualizer.sync(time_sec, self.clock.playing)
+            self.lyric_overlay.karaoke.resync(self.clock.playing)
         except Exception as e:
             print("点击歌词跳转失败:", e)
 
-    def save_playlist(self):
-        try:
-            data = {
-                "playlist": self.playlist,
-                "current_index": self.current_index,
-                "position": self.player.get_time() / 1000 if self.player else 0
-            }
-            with open("playlist.json", "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print("保存播放列表失败：", e)
+    def current_play_time(self):
+        return self.clock.now()
 
-    def load_saved_playlist(self):
-        try:
-            if os.path.exists("playlist.json"):
-                with open("playlist.json", "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.playlist = data.get("playlist", [])
-                    self.current_index = data.get("current_index", 0)
-                    position = data.get("position", 0)
-                    self.list_widget.clear()
-                    for path in self.playlist:
-                        self.list_widget.addItem(os.path.basename(path))
-                    if self.playlist:
-                        self.restoring = True
-                        self.list_widget.setCurrentRow(self.current_index)
-                        self.play_file(self.playlist[self.current_index])
-                        self.player.play()  # <- 强制调用一次 play，让 VLC 提前进入播放状态
-                        def restore_position():
-                            if self.player.get_state() == vlc.State.Playing:
-                                self.player.set_time(int(position * 1000))
-                                self.restoring = False
-                            else:
-                                QTimer.singleShot(200, restore_position)
-                        restore_position()
-        except Exception as e:
-            print("加载播放列表失败：", e)
+    def track_length(self):
+        # VLC 解出的真实时长优先，VBR 文件不再漂移
+        return self.clock.length or self.duration
+
+    # 播放列表加载、入队、状态保存的主体在 PlaylistLogic 中，以下为界面侧的通知钩子
+    def playlist_loaded(self):
+        self.list_widget.clear()
+        for path in self.playlist:
+            self.list_widget.addItem(os.path.basename(path))
+        self.album_model.set_albums(self.playlist)
+        self.loudness.refresh(self.playlist)
+
+    def queue_changed(self):
+        if self.gapless.next_index is not None:
+            self.gapless.reset()  # 已预选的下一首可能不再是队首
+        self.prefetch_upcoming()
 
     def init_ui(self):
         main_layout = QHBoxLayout(self)
@@ -296,9 +2413,11 @@ class MusicPlayer(QWidget):
 
         top_bar = QHBoxLayout()
         self.btn_playlist = QPushButton("🎵 播放列表")
+        self.btn_album_grid = QPushButton("🗂 专辑")
         self.btn_theme = QPushButton("🌗")
         self.btn_settings = QPushButton("⚙")
         top_bar.addWidget(self.btn_playlist)
+        top_bar.addWidget(self.btn_album_grid)
         top_bar.addStretch()
         top_bar.addWidget(self.btn_theme)
         top_bar.addWidget(self.btn_settings)
@@ -312,6 +2431,52 @@ class MusicPlayer(QWidget):
         self.anim_toggle.setText("✅ 启动动画：已开启" if self.anim_toggle.isChecked() else "❌ 启动动画：已关闭")
         self.anim_toggle.clicked.connect(self.toggle_startup_animation)
         settings_layout.addWidget(self.anim_toggle)
+        self.accent_toggle = QPushButton()
+        self.accent_toggle.setCheckable(True)
+        self.accent_toggle.setChecked(NUMPY_AVAILABLE and self.settings.value("accent_from_cover", False, type=bool))
+        self.accent_toggle.setEnabled(NUMPY_AVAILABLE)
+        self.accent_toggle.setText("🎨 封面取色：已开启" if self.accent_toggle.isChecked() else "🎨 封面取色：已关闭")
+        self.accent_toggle.clicked.connect(self.toggle_cover_accent)
+        settings_layout.addWidget(self.accent_toggle)
+        self.slow_toggle = QPushButton()
+        self.slow_toggle.setCheckable(True)
+        self.slow_toggle.setChecked(self.settings.value("slow_storage_mode", False, type=bool))
+        self.slow_toggle.clicked.connect(self.toggle_slow_storage)
+        self.toggle_slow_storage()
+        settings_layout.addWidget(self.slow_toggle)
+        self.spread_toggle = QPushButton()
+        self.spread_toggle.setCheckable(True)
+        self.spread_toggle.setChecked(self.settings.value("shuffle_artist_spread", False, type=bool))
+        self.spread_toggle.clicked.connect(self.toggle_artist_spread)
+        self.toggle_artist_spread()
+        settings_layout.addWidget(self.spread_toggle)
+        self.btn_loudness_mode = QPushButton()
+        self.btn_loudness_mode.clicked.connect(self.switch_loudness_mode)
+        self.btn_analyze = QPushButton("📊 分析音乐库响度")
+        self.btn_analyze.clicked.connect(self.analyze_library_loudness)
+        self.btn_loudness_mode.setEnabled(DECODE_AVAILABLE)
+        self.btn_analyze.setEnabled(DECODE_AVAILABLE)
+        if not DECODE_AVAILABLE:
+            self.btn_loudness_mode.setToolTip(DECODE_MISSING_TIP)
+            self.btn_analyze.setToolTip(DECODE_MISSING_TIP)
+        self.update_loudness_button()
+        self.loudness.signals.progress.connect(self.on_loudness_progress)
+        settings_layout.addWidget(self.btn_loudness_mode)
+        settings_layout.addWidget(self.btn_analyze)
+        self.spectrum_toggle = QPushButton()
+        self.spectrum_toggle.setCheckable(True)
+        self.spectrum_toggle.setChecked(NUMPY_AVAILABLE and self.settings.value("spectrum_enabled", False, type=bool))
+        self.spectrum_toggle.setEnabled(NUMPY_AVAILABLE)
+        self.spectrum_toggle.clicked.connect(self.toggle_spectrum)
+        settings_layout.addWidget(self.spectrum_toggle)
+        self.waveform_toggle = QPushButton()
+        self.waveform_toggle.setCheckable(True)
+        self.waveform_toggle.setChecked(DECODE_AVAILABLE and self.settings.value("waveform_seekbar", False, type=bool))
+        self.waveform_toggle.setEnabled(DECODE_AVAILABLE)
+        if not DECODE_AVAILABLE:
+            self.waveform_toggle.setToolTip(DECODE_MISSING_TIP)
+        self.waveform_toggle.clicked.connect(self.toggle_waveform)
+        settings_layout.addWidget(self.waveform_toggle)
         self.vlc_vol_label = QLabel("🎚️ VLC 音量")
         self.vlc_vol_slider = QSlider(Qt.Horizontal)
         self.vlc_vol_slider.setRange(0, 100)
@@ -319,6 +2484,32 @@ class MusicPlayer(QWidget):
         self.vlc_vol_slider.valueChanged.connect(self.set_vlc_volume)
         settings_layout.addWidget(self.vlc_vol_label)
         settings_layout.addWidget(self.vlc_vol_slider)
+        crossfade = self.settings.value("crossfade_sec", 0, type=int)
+        self.crossfade_label = QLabel(f"🔀 淡入淡出：{crossfade} 秒")
+        self.crossfade_slider = QSlider(Qt.Horizontal)
+        self.crossfade_slider.setRange(0, GaplessEngine.MAX_CROSSFADE)
+        self.crossfade_slider.setValue(crossfade)
+        self.crossfade_slider.valueChanged.connect(self.set_crossfade)
+        self.gapless.set_crossfade(crossfade)
+        settings_layout.addWidget(self.crossfade_label)
+        settings_layout.addWidget(self.crossfade_slider)
+        self.btn_rate = QPushButton()
+        self.btn_rate.clicked.connect(self.switch_playback_rate)
+        settings_layout.addWidget(self.btn_rate)
+        self.set_playback_rate(self.settings.value("playback_rate", 1.0, type=float))
+        self.btn_vlc_profile = QPushButton()
+        self.btn_vlc_profile.clicked.connect(self.switch_vlc_profile)
+        self.update_vlc_profile_button()
+        settings_layout.addWidget(self.btn_vlc_profile)
+        # 环境变量 MYPLAYER_CONTROL 指定地址时总是开启
+        self.control_address = os.environ.get("MYPLAYER_CONTROL") or CONTROL_DEFAULT
+        self.control_toggle = QPushButton()
+        self.control_toggle.setCheckable(True)
+        self.control_toggle.setChecked(bool(os.environ.get("MYPLAYER_CONTROL"))
+                                       or self.settings.value("control_api", False, type=bool))
+        self.control_toggle.clicked.connect(self.toggle_control_api)
+        self.toggle_control_api()
+        settings_layout.addWidget(self.control_toggle)
         self.btn_toggle_lyric = QPushButton("🪟 显示/隐藏悬浮歌词")
         self.btn_toggle_lyric.clicked.connect(self.toggle_lyric_overlay)
         settings_layout.addWidget(self.btn_toggle_lyric)
@@ -335,7 +2526,13 @@ class MusicPlayer(QWidget):
         self.list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
         self.list_widget.customContextMenuRequested.connect(self.show_playlist_context_menu)
         self.list_widget.itemClicked.connect(self.song_selected)
+        self.list_widget.setSelectionMode(QListWidget.ExtendedSelection)
         playlist_layout.addWidget(self.list_widget)
+        self.album_model = AlbumGridModel(self.cover_cache, self.folder_art, self)
+        self.album_grid = AlbumGridView(self.album_model)
+        self.album_grid.clicked.connect(self.album_selected)
+        self.album_grid.setVisible(False)
+        playlist_layout.addWidget(self.album_grid)
         self.left_layout.addWidget(playlist_card)
 
         cover_card = QFrame()
@@ -350,17 +2547,20 @@ class MusicPlayer(QWidget):
         self.title.setFont(QFont("微软雅黑", 14))
         cover_layout.addWidget(self.cover)
         cover_layout.addWidget(self.title)
+        if self.visualizer is not None:
+            self.spectrum_view = SpectrumView(self.visualizer)
+            self.spectrum_view.visibilityChanged.connect(self.update_visualizer_active)
+            cover_layout.addWidget(self.spectrum_view)
+        self.toggle_spectrum()
         self.left_layout.addWidget(cover_card)
 
         lyric_card = QFrame()
         lyric_card.setObjectName("card")
         lyric_layout = QVBoxLayout(lyric_card)
-        self.lyric_browser = QTextBrowser()
-        self.lyric_browser.setFont(QFont("微软雅黑", 12))
-        self.lyric_browser.verticalScrollBar().valueChanged.connect(self.on_lyric_scroll)
-        self.lyric_browser.setOpenExternalLinks(False)
-        self.lyric_browser.anchorClicked.connect(self.seek_to_lyric_time)
-        lyric_layout.addWidget(self.lyric_browser)
+        self.lyric_view = LyricView()
+        self.lyric_view.userScrolled.connect(self.on_lyric_scroll)
+        self.lyric_view.lineClicked.connect(self.seek_to)
+        lyric_layout.addWidget(self.lyric_view)
         self.btn_jump_to_current = QPushButton("📍 回到当前歌词")
         self.btn_jump_to_current.clicked.connect(self.unlock_lyrics)
         lyric_layout.addWidget(self.btn_jump_to_current)
@@ -377,11 +2577,13 @@ class MusicPlayer(QWidget):
         for btn in [self.btn_folder, self.btn_prev, self.btn_play, self.btn_next, self.btn_mode]:
             controls.addWidget(btn)
         controls_layout.addLayout(controls)
-        self.progress_slider = QSlider(Qt.Horizontal)
+        self.progress_slider = WaveformSlider()
         self.progress_slider.setRange(0, 1000)
         self.progress_slider.sliderPressed.connect(self.start_seek)
+        self.progress_slider.sliderMoved.connect(self.scrub)
         self.progress_slider.sliderReleased.connect(self.seek)
         controls_layout.addWidget(self.progress_slider)
+        self.toggle_waveform()
         self.time_label = QLabel("00:00 / 00:00")
         self.volume_slider = QSlider(Qt.Horizontal)
         self.volume_slider.setRange(0, 100)
@@ -401,12 +2603,13 @@ class MusicPlayer(QWidget):
         main_layout.addLayout(self.right_layout, 6)
         self.setLayout(main_layout)
 
-        self.btn_play.clicked.connect(self.toggle_play)
+        self.btn_play.clicked.connect(self.toggle_pause)
         self.btn_next.clicked.connect(self.play_next)
         self.btn_prev.clicked.connect(self.play_prev)
         self.btn_mode.clicked.connect(self.switch_mode)
         self.btn_folder.clicked.connect(self.choose_folder)
         self.btn_playlist.clicked.connect(self.toggle_playlist)
+        self.btn_album_grid.clicked.connect(self.toggle_album_grid)
 
         if PYCAW_AVAILABLE and hasattr(self, 'volume_ctrl'):
             try:
@@ -423,6 +2626,8 @@ class MusicPlayer(QWidget):
             self.btn_toggle_lyric_mode.setText("切换为单行歌词")
         else:
             self.btn_toggle_lyric_mode.setText("切换为双行歌词")
+        if self.lyrics:
+            self.render_lyrics(self.lyric_scheduler.line_at(self.current_play_time()))
 
     def toggle_lyric_overlay(self):
         if self.lyric_overlay.isVisible():
@@ -450,72 +2655,304 @@ class MusicPlayer(QWidget):
             self.showNormal()
 
     def play_file(self, path):
-        self.player.set_media(self.instance.media_new(path))
+        # 音频立即开始，封面 / 歌词 / 时长交给后台线程，结果到达后再填充界面
+        self.gapless.reset()
+        self.clock.reset()
+        self.player.set_media(self.make_media(path))
+        self.apply_loudness_gain(self.player, path)
         self.player.play()
+        self.track_changed(path)
+
+    def on_gapless_switched(self, index):
+        self.player = self.gapless.active
+        self.playback_events.follow(self.player)
+        self.current_index = index
+        self.list_widget.setCurrentRow(index)
+        self.track_changed(self.playlist[index])
+
+    def track_changed(self, path):
+        self.current_path = path
+        if self.play_queue and self.play_queue[0] == path:
+            self.play_queue.popleft()
+        self.shuffle.visit(self.current_index)
+        self.prefetch_upcoming()
+        if self.visualizer is not None:
+            self.visualizer.load(path)
         self.title.setText(os.path.basename(path))
         self.btn_play.setText("⏸️")
+        self.last_lyric_push = -1
+        self.publish("track", index=self.current_index, path=path, title=os.path.basename(path))
+        self.load_generation += 1
+        self.load_pool.clear()  # 尚未开始的旧任务直接取消
+        self.duration = 0
+        self.lyrics = []
+        self.lyric_words = []
+        self.lyric_view.set_lines([])
+        self.lyric_scheduler.set_times([])
         self.load_cover(path)
-        self.load_lyrics(path)
-        try:
-            self.duration = MP3(path).info.length
-        except:
-            self.duration = 0
-        if not getattr(self, 'restoring', False):
-            self.save_playlist()
+        self.submit_load("lyrics", read_lyrics, path)
+        self.submit_load("duration", read_duration, path)
+        self.progress_slider.set_peaks(None)
+        if self.waveform_toggle.isChecked():
+            self.submit_waveform(path)
+        self.save_state()
+
+    def current_load_generation(self):
+        return self.load_generation
+
+    def submit_load(self, stage, fn, *args):
+        self.load_pool.start(TrackLoadTask(self.track_loader, self.load_generation,
+                                           self.current_load_generation, stage, fn, *args))
+
+    def submit_waveform(self, path):
+        # 切歌后正在解码的旧曲目在下一个数据块处中止，排队中的直接取消
+        generation = self.load_generation
+        self.waveform_pool.clear()
+        self.waveform_pool.start(TrackLoadTask(
+            self.track_loader, generation, self.current_load_generation, "waveform",
+            self.waveform_cache.load, path, lambda: self.current_load_generation() != generation))
+
+    def on_track_loaded(self, generation, stage, result):
+        if generation != self.load_generation:
+            return
+        if stage == "cover":
+            if not result:
+                self.show_cover(None)
+                return
+            track_key, image_key, image = result
+            if image is not None:
+                pixmap = QPixmap.fromImage(image)
+                self.cover_cache.put(image_key, pixmap)
+            else:
+                hit, pixmap = self.cover_cache.lookup(image_key)
+                if not hit and image_key == track_key:
+                    self.cover_cache.put(image_key, None)
+            if image_key != track_key:
+                self.cover_cache.alias(track_key, image_key)
+            self.show_cover(pixmap)
+        elif stage == "lyrics" and result:
+            self.lyrics, self.lyric_words = result
+            self.lyric_view.set_lines(list(self.lyrics))
+            self.lyric_scheduler.set_times(t for t, _ in self.lyrics)
+            self.lyric_scheduler.sync(self.clock.now(), True)
+        elif stage == "duration" and result:
+            self.duration = result
+        elif stage == "waveform":
+            self.progress_slider.set_peaks(result)
+        elif stage == "accent" and result:
+            folder, color = result
+            self.accent_cache[folder] = color
+            self.apply_accent(color)
 
     def load_cover(self, path):
         try:
-            tags = ID3(path)
-            for tag in tags.values():
-                if tag.FrameID == "APIC":
-                    image = Image.open(io.BytesIO(tag.data)).resize((200, 200))
-                    buf = io.BytesIO()
-                    image.save(buf, format='PNG')
-                    pixmap = QPixmap()
-                    pixmap.loadFromData(buf.getvalue())
-                    self.cover.setPixmap(pixmap)
-                    return
-        except:
-            pass
+            if self.slow_toggle.isChecked():
+                key = run_with_timeout(self.cover_cache.key, path, 200)
+            else:
+                key = self.cover_cache.key(path, 200)
+        except TimeoutError:
+            # 共享盘响应太慢：连同计算键一起交给后台线程
+            self.cover.setText("🎵")
+            self.submit_load("cover", self.cover_cache.load_track_cover, None, path, 200, self.folder_art)
+            return
+        except OSError:
+            self.show_cover(None)
+            return
+        hit, pixmap = self.cover_cache.lookup(key)
+        if hit:
+            self.show_cover(pixmap)
+            return
         self.cover.setText("🎵")
+        self.submit_load("cover", self.cover_cache.load_track_cover, key, path, 200, self.folder_art)
+
+    def show_cover(self, pixmap):
+        if pixmap is not None:
+            self.cover.setPixmap(pixmap)
+        else:
+            self.cover.setText("🎵")
+        self.cover.setToolTip("封面缓存：" + self.cover_cache.stats_text())
+        self.update_accent(pixmap)
 
-    def load_lyrics(self, path):
-        self.lyrics.clear()
-        folder = os.path.dirname(path)
-        base = os.path.splitext(os.path.basename(path))[0]
-        for f in os.listdir(folder):
-            if f.endswith(".lrc") and base in f:
-                with open(os.path.join(folder, f), encoding="utf-8", errors="ignore") as lrc:
-                    for line in lrc:
-                        if "[" in line and "]" in line:
-                            try:
-                                time_tag = line[line.find("[")+1:line.find("]")]
-                                text = line[line.find("]")+1:].strip()
-                                mins, secs = time_tag.split(":")
-                                sec = int(mins) * 60 + float(secs)
-                                self.lyrics.append((sec, text))
-                            except:
-                                continue
-                break
-        self.lyrics.sort()
+    def update_accent(self, pixmap):
+        if not self.accent_toggle.isChecked() or not self.current_path:
+            return
+        folder = os.path.dirname(self.current_path)
+        if folder in self.accent_cache:
+            self.apply_accent(self.accent_cache[folder])
+        elif pixmap is None or pixmap.isNull():
+            self.apply_accent(None)
+        else:
+            self.submit_load("accent", lambda image: (folder, dominant_color(image)), pixmap.toImage())
+
+    def apply_accent(self, color):
+        palette = QPalette(self.base_palette)
+        if color is not None:
+            accent = QColor(*color)
+            palette.setColor(QPalette.Link, accent)
+            palette.setColor(QPalette.Highlight, accent)
+        if palette == self.palette():
+            return
+        self.setPalette(palette)
+        self.lyric_overlay.setPalette(palette)
+
+    def toggle_slow_storage(self):
+        enabled = self.slow_toggle.isChecked()
+        self.settings.setValue("slow_storage_mode", enabled)
+        self.slow_toggle.setText("🐢 慢速存储模式：已开启" if enabled else "🐢 慢速存储模式：已关闭")
+        # 慢速存储下提前很多开始准备下一首，给预读留足时间
+        self.gapless.preload_sec = 60 if enabled else GaplessEngine.PRELOAD_SEC
+        if not enabled:
+            self.read_ahead.clear()
+
+    def make_media(self, path):
+        # 慢速存储模式下已预读的曲目通过 libvlc 回调媒体从内存播放
+        data = self.read_ahead.get(path) if self.slow_toggle.isChecked() else None
+        if data is None:
+            return self.instance.media_new(path)
+        return memory_media(self.instance, data)
+
+    def prefetch_upcoming(self):
+        if not self.slow_toggle.isChecked() or not self.playlist:
+            return
+        paths = list(self.play_queue)[:2]
+        n = len(self.playlist)
+        if self.play_mode == "loop_one":
+            paths.append(self.playlist[self.current_index])
+        elif self.play_mode == "shuffle":
+            # next() 不改变状态，返回的正是之后真正会播放的那一首
+            ahead = self.shuffle.history[self.shuffle.pos + 1:self.shuffle.pos + 3]
+            if not ahead:
+                ahead = [self.shuffle.next(n)]
+            paths.extend(self.playlist[i] for i in ahead if i is not None and i < n)
+        else:
+            paths.extend(self.playlist[(self.current_index + k) % n] for k in (1, 2))
+        self.read_ahead.prefetch(paths)
+
+    def update_loudness_button(self):
+        names = {"off": "关闭", "track": "单曲", "album": "专辑"}
+        self.btn_loudness_mode.setText(f"🔈 音量均衡：{names[self.loudness_mode]}")
+
+    def switch_loudness_mode(self):
+        modes = {"off": "track", "track": "album", "album": "off"}
+        self.loudness_mode = modes[self.loudness_mode]
+        self.settings.setValue("loudness_mode", self.loudness_mode)
+        self.update_loudness_button()
+        self.apply_loudness_gain(self.player, self.current_path)
+
+    def analyze_library_loudness(self):
+        self.loudness.analyze(list(self.playlist))
+
+    def on_loudness_progress(self, done, total):
+        self.btn_analyze.setText(f"📊 响度分析中：{done}/{total}")
+        if done == total:
+            self.btn_analyze.setText("📊 分析音乐库响度")
+            self.apply_loudness_gain(self.player, self.current_path)
+
+    def apply_loudness_gain(self, player, path):
+        # 通过 VLC 均衡器的前级增益施加 dB 增益，不占用音量滑块
+        if self.loudness_mode == "off" or not path:
+            player.set_equalizer(None)
+            return
+        eq = vlc.AudioEqualizer()
+        eq.set_preamp(self.loudness.gain_db(path, self.loudness_mode))
+        player.set_equalizer(eq)
+
+    def toggle_control_api(self):
+        enabled = self.control_toggle.isChecked()
+        self.settings.setValue("control_api", enabled)
+        if enabled and self.control_server is None:
+            self.control_server = ControlServer(self.control_bridge.request, self.control_address)
+            if not self.control_server.start():
+                self.control_server = None
+        elif not enabled and self.control_server is not None:
+            self.control_server.stop()
+            self.control_server = None
+        running = self.control_server is not None
+        self.control_toggle.setChecked(running)
+        self.control_toggle.setText(f"🛰 控制接口：{self.control_address}" if running else "🛰 控制接口：已关闭")
+        self.control_toggle.setToolTip(f"令牌文件：{self.control_server.token_file}" if running else "")
+
+    def publish(self, event, **data):
+        if self.control_server is not None:
+            self.control_server.publish(event, **data)
+
+    # 控制接口命令由 PlaylistLogic.control_command 在界面线程执行，以下为它调用的操作
+    def play(self):
+        if not self.clock.playing:
+            self.toggle_pause()
+
+    def pause(self):
+        if self.clock.playing:
+            self.toggle_pause()
+
+    def set_mode(self, mode):
+        while self.play_mode != mode:
+            self.switch_mode()
+
+    def update_vlc_profile_button(self):
+        saved = self.settings.value("vlc_profile", "default")
+        text = f"🧩 VLC 配置：{VLC_PROFILE_NAMES.get(saved, saved)}"
+        if saved != self.vlc_profile:
+            text += "（重启后生效）"
+        self.btn_vlc_profile.setText(text)
+
+    def switch_vlc_profile(self):
+        # 实例参数只能在创建时指定，切换后下次启动生效
+        names = list(VLC_PROFILES)
+        saved = self.settings.value("vlc_profile", "default")
+        index = names.index(saved) if saved in names else -1
+        self.settings.setValue("vlc_profile", names[(index + 1) % len(names)])
+        self.update_vlc_profile_button()
+
+    def toggle_waveform(self):
+        enabled = self.waveform_toggle.isChecked()
+        self.settings.setValue("waveform_seekbar", enabled)
+        self.waveform_toggle.setText("〰 波形进度条：已开启" if enabled else "〰 波形进度条：已关闭")
+        if not enabled:
+            self.progress_slider.set_peaks(None)
+        elif self.current_path:
+            self.submit_waveform(self.current_path)
+
+    def toggle_spectrum(self):
+        enabled = self.spectrum_toggle.isChecked()
+        self.settings.setValue("spectrum_enabled", enabled)
+        self.spectrum_toggle.setText("🌈 频谱：已开启" if enabled else "🌈 频谱：已关闭")
+        if self.visualizer is not None:
+            self.spectrum_view.setVisible(enabled)
+            self.update_visualizer_active()
+
+    def update_visualizer_active(self, *_):
+        # 隐藏、最小化或关闭开关时彻底停掉旁路解码和分析线程
+        if self.visualizer is None:
+            return
+        active = (self.spectrum_toggle.isChecked() and self.spectrum_view.isVisible()
+                  and not self.isMinimized())
+        self.visualizer.set_active(active, self.clock.now(), self.clock.playing)
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_visualizer_active()
+
+    def toggle_artist_spread(self):
+        enabled = self.spread_toggle.isChecked()
+        self.settings.setValue("shuffle_artist_spread", enabled)
+        self.spread_toggle.setText("🎤 随机避开同一歌手：已开启" if enabled else "🎤 随机避开同一歌手：已关闭")
+        self.shuffle.artist_of = (lambda i: artist_from_filename(self.playlist[i])) if enabled else None
+
+    def toggle_cover_accent(self):
+        enabled = self.accent_toggle.isChecked()
+        self.settings.setValue("accent_from_cover", enabled)
+        self.accent_toggle.setText("🎨 封面取色：已开启" if enabled else "🎨 封面取色：已关闭")
+        if enabled:
+            self.update_accent(self.cover.pixmap())
+        else:
+            self.apply_accent(None)
 
     def choose_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "选择音乐文件夹")
         if folder:
-            self.load_music_files(folder)
-
-    def load_music_files(self, folder):
-        self.playlist.clear()
-        self.list_widget.clear()
-        for f in os.listdir(folder):
-            if f.lower().endswith((".mp3", ".wav", ".flac")):
-                path = os.path.join(folder, f)
-                self.playlist.append(path)
-                self.list_widget.addItem(os.path.basename(f))
-        if self.playlist:
-            self.current_index = 0
-            self.list_widget.setCurrentRow(0)
-            self.play_file(self.playlist[0])
+            self.load_folder(folder)
 
     def toggle_startup_animation(self):
         enabled = self.anim_toggle.isChecked()
@@ -529,47 +2966,131 @@ class MusicPlayer(QWidget):
     def toggle_settings_menu(self):
         self.settings_menu.setVisible(not self.settings_menu.isVisible())
 
-    def toggle_play(self):
-        if self.player.is_playing():
+    def toggle_pause(self):
+        # 按钮状态、歌词定时等由 Playing / Paused 事件驱动
+        if self.clock.playing:
             self.player.pause()
-            self.btn_play.setText("▶️")
+            self.clock.pause()
         else:
             self.player.play()
-            self.btn_play.setText("⏸️")
 
-    def play_next(self):
-        if not self.playlist:
-            return
-        self.current_index = (self.current_index + 1) % len(self.playlist)
-        self.list_widget.setCurrentRow(self.current_index)
-        self.play_file(self.playlist[self.current_index])
-
-    def play_prev(self):
-        if not self.playlist:
-            return
-        self.current_index = (self.current_index - 1) % len(self.playlist)
-        self.list_widget.setCurrentRow(self.current_index)
-        self.play_file(self.playlist[self.current_index])
+    def on_playing(self):
+        self.btn_play.setText("⏸️")
+        self.publish("state", playing=True)
+        if self.pending_restore is not None:
+            position, self.pending_restore = self.pending_restore, None
+            self.player.set_time(int(position * 1000))
+            self.clock.seek(position)
+        self.lyric_scheduler.sync(self.current_play_time(), True)
+        self.lyric_overlay.karaoke.set_running(True)
+        if self.visualizer is not None:
+            self.visualizer.sync(self.clock.now(), True)
+        self.gapless.poll(self.clock.now(), self.track_length(), self.pick_next_index,
+                          lambda i: self.playlist[i])
+
+    def on_paused(self):
+        self.btn_play.setText("▶️")
+        self.publish("state", playing=False)
+        self.gapless.suspend()
+        self.lyric_scheduler.stop()
+        self.lyric_overlay.karaoke.set_running(False)
+        if self.visualizer is not None:
+            self.visualizer.sync(self.clock.now(), False)
+
+    def on_track_ended(self):
+        # 无缝切换未能生效时的兜底
+        index = self.gapless.next_index
+        if index is None:
+            index = self.pick_next_index()
+        if index is not None:
+            self.current_index = index
+            self.list_widget.setCurrentRow(index)
+            self.play_file(self.playlist[index])
+
+    def on_playback_error(self):
+        print("播放出错，跳到下一首：", self.current_path)
+        self.gapless.reset()
+        if len(self.playlist) > 1:
+            self.play_next()
+
+    def play_index(self, index):
+        self.current_index = index
+        self.list_widget.setCurrentRow(index)
+        self.play_file(self.playlist[index])
 
     def toggle_playlist(self):
         self.playlist_visible = not self.playlist_visible
-        self.list_widget.setVisible(self.playlist_visible)
+        self.list_widget.setVisible(self.playlist_visible and not self.album_mode)
+        self.album_grid.setVisible(self.playlist_visible and self.album_mode)
         self.cover.setFixedSize(220 if self.playlist_visible else 300,
                                 220 if self.playlist_visible else 300)
 
+    def toggle_album_grid(self):
+        self.album_mode = not self.album_mode
+        self.btn_album_grid.setText("📃 列表" if self.album_mode else "🗂 专辑")
+        self.list_widget.setVisible(self.playlist_visible and not self.album_mode)
+        self.album_grid.setVisible(self.playlist_visible and self.album_mode)
+
+    def album_selected(self, index):
+        rows = self.album_model.albums[index.row()][2]
+        self.current_index = rows[0]
+        self.list_widget.setCurrentRow(self.current_index)
+        self.play_file(self.playlist[self.current_index])
+
     def switch_mode(self):
         modes = {"loop_all": "loop_one", "loop_one": "shuffle", "shuffle": "loop_all"}
         icons = {"loop_all": "🔁", "loop_one": "🔂", "shuffle": "🔀"}
         self.play_mode = modes[self.play_mode]
+        self.gapless.reset()
         self.btn_mode.setText(icons[self.play_mode])
+        self.publish("mode", mode=self.play_mode)
         self.btn_mode.repaint()
 
     def start_seek(self):
         self.user_seeking = True
 
+    def scrub(self, value):
+        # 拖动中：时间和歌词先行更新，真正的跳转交给 SeekThrottle 限速合并
+        length = self.track_length()
+        if not length:
+            return
+        target = value / 1000 * length
+        self.show_time(target, length)
+        if self.lyrics:
+            self.render_lyrics(self.lyric_scheduler.line_at(target))
+        self.seek_throttle.request(self.player, target)
+
     def seek(self):
-        self.player.set_position(self.progress_slider.value() / 1000)
+        length = self.track_length()
+        pos = self.progress_slider.value() / 1000
+        if length:
+            self.seek_throttle.finish(self.player, pos * length)
+        else:
+            self.player.set_position(pos)
         self.user_seeking = False
+        self.clock.seek(pos * length)
+        self.lyric_scheduler.sync(self.clock.now(), self.clock.playing)
+        if self.visualizer is not None:
+            self.visualizer.sync(self.clock.now(), self.clock.playing)
+        self.gapless.poll(self.clock.now(), self.track_length(), self.pick_next_index,
+                          lambda i: self.playlist[i])
+        self.lyric_overlay.karaoke.resync(self.clock.playing)
+
+    def switch_playback_rate(self):
+        rates = PLAYBACK_RATES
+        current = self.clock.rate
+        index = rates.index(current) if current in rates else rates.index(1.0)
+        self.set_playback_rate(rates[(index + 1) % len(rates)])
+
+    def set_playback_rate(self, rate):
+        self.settings.setValue("playback_rate", rate)
+        self.btn_rate.setText(f"⏩ 倍速：{rate:g}×")
+        self.player.set_rate(rate)
+        self.gapless.set_rate(rate)
+        self.clock.set_rate(rate)
+        self.lyric_scheduler.set_rate(rate, self.clock.now(), self.clock.playing)
+        if self.visualizer is not None:
+            self.visualizer.set_rate(rate)
 
     def set_system_volume(self, val):
         if PYCAW_AVAILABLE and hasattr(self, 'volume_ctrl'):
@@ -578,77 +3099,88 @@ class MusicPlayer(QWidget):
             except:
                 pass
 
+    def set_crossfade(self, val):
+        self.settings.setValue("crossfade_sec", val)
+        self.crossfade_label.setText(f"🔀 淡入淡出：{val} 秒")
+        self.gapless.reset()
+        self.gapless.set_crossfade(val)
+
     def set_vlc_volume(self, val):
         if self.player:
-            self.player.audio_set_volume(val)
+            self.gapless.set_volume(val)
 
     def on_lyric_scroll(self):
         self.lyric_locked = True
 
     def unlock_lyrics(self):
         self.lyric_locked = False
-
-    def update_ui(self):
-        if self.player.is_playing() and not self.user_seeking:
-            pos = self.player.get_position()
-            cur_time = pos * self.duration
-            self.progress_slider.setValue(int(pos * 1000))
-            self.time_label.setText(f"{int(cur_time//60):02}:{int(cur_time%60):02} / {int(self.duration//60):02}:{int(self.duration%60):02}")
-            self.update_lyrics(cur_time)
-        if self.player.get_state() == vlc.State.Ended:
-            if self.play_mode == "loop_one":
-                self.play_file(self.playlist[self.current_index])
-            elif self.play_mode == "shuffle":
-                self.current_index = random.randint(0, len(self.playlist)-1)
-                self.play_file(self.playlist[self.current_index])
-            else:
-                self.play_next()
-
-    def update_lyrics(self, current_time):
+        if self.lyrics:
+            self.render_lyrics(self.lyric_scheduler.line_at(self.current_play_time()))
+
+    def update_ui(self, event_time=None):
+        # 由 VLC 的 TimeChanged 事件驱动，不再定时轮询
+        if event_time is not None:
+            self.seek_throttle.confirm(event_time)
+        if self.user_seeking:
+            return
+        cur_time = self.clock.now()
+        length = self.track_length()
+        pos = min(1.0, cur_time / length) if length else 0
+        self.progress_slider.setValue(int(pos * 1000))
+        self.show_time(cur_time, length)
+        self.gapless.poll(cur_time, length, self.pick_next_index, lambda i: self.playlist[i])
+        if time.monotonic() - self.last_position_push >= 1.0:
+            self.last_position_push = time.monotonic()
+            self.publish("position", time=cur_time, length=length)
+
+    def show_time(self, cur_time, length):
+        self.time_label.setText(f"{int(cur_time//60):02}:{int(cur_time%60):02} / {int(length//60):02}:{int(length%60):02}")
+
+    def render_lyrics(self, current_index):
         if not self.lyrics:
             return
-        current_index = 0
-        for i, (t, _) in enumerate(self.lyrics):
-            if current_time < t:
-                current_index = max(0, i - 1)
-                break
-        html_lines = []
-        for i, (t, line) in enumerate(self.lyrics):
-            if i == current_index:
-                html_lines.append(f'<a href="{t}"><p style="color:red; font-weight:bold; text-align:center; text-decoration:none;">{line}</p></a>')
-            else:
-                html_lines.append(f'<a href="{t}"><p style="color:gray; text-align:center; text-decoration:none;">{line}</p></a>')
-        if self.lyric_locked:
-            scrollbar = self.lyric_browser.verticalScrollBar()
-            cur_scroll = scrollbar.value()
-            self.lyric_browser.setHtml("".join(html_lines))
-            scrollbar.setValue(cur_scroll)
-        else:
-            self.lyric_browser.setHtml("".join(html_lines))
-            cursor = self.lyric_browser.textCursor()
-            cursor.movePosition(QTextCursor.Start)
-            for _ in range(current_index):
-                cursor.movePosition(QTextCursor.Down)
-            self.lyric_browser.setTextCursor(cursor)
-            self.lyric_browser.ensureCursorVisible()
-        if self.double_line_mode:
+        if current_index != self.last_lyric_push:
+            self.last_lyric_push = current_index
+            self.publish("lyric", index=current_index, text=self.lyrics[current_index][1])
+        self.lyric_view.set_current(current_index, follow=not self.lyric_locked)
+        words, end = self.lyric_words[current_index]
+        if words:
             current_line = self.lyrics[current_index][1]
+            next_line = ""
+            if current_index+1 < len(self.lyrics):
+                if end is None:
+                    end = self.lyrics[current_index+1][0]
+                if self.double_line_mode:
+                    next_line = self.lyrics[current_index+1][1]
+            if end is None:
+                end = words[-1][0] + 1.0
+            self.lyric_overlay.show_karaoke(current_line, words, end, next_line)
+            return
+        current_line = self.lyrics[current_index][1]
+        if self.double_line_mode:
             next_line = self.lyrics[current_index+1][1] if current_index+1 < len(self.lyrics) else ""
-            display_text = f'<span style="color:red; font-weight:bold;">{current_line}</span><br/>{next_line}'
+            self.lyric_overlay.update_lyric(current_line, next_line)
         else:
-            current_line = self.lyrics[current_index][1]
-            display_text = f'<span style="color:red; font-weight:bold;">{current_line}</span>'
-        self.lyric_overlay.update_lyric(display_text)
+            self.lyric_overlay.update_lyric(current_line)
 
     def show_playlist_context_menu(self, pos):
         menu = QMenu()
+        play_next_action = menu.addAction("⏭ 下一首播放")
+        enqueue_action = menu.addAction("➕ 添加到待播队列")
+        menu.addSeparator()
         remove_action = menu.addAction("🗑 删除当前歌曲")
         action = menu.exec_(self.list_widget.mapToGlobal(pos))
         if action == remove_action:
             row = self.list_widget.currentRow()
             if row >= 0:
                 del self.playlist[row]
+                self.playlist_changed()
                 self.list_widget.takeItem(row)
+                self.gapless.reset()
+                self.album_model.set_albums(self.playlist)
+        elif action in (play_next_action, enqueue_action):
+            rows = sorted(self.list_widget.row(item) for item in self.list_widget.selectedItems())
+            self.enqueue([self.playlist[r] for r in rows], play_next=action == play_next_action)
 
     def theme_button_clicked(self):
         self.animate_button_click(self.btn_theme)
@@ -686,16 +3218,72 @@ class MusicPlayer(QWidget):
         anim.start()
 
     def closeEvent(self, event):
+        print("封面缓存：", self.cover_cache.stats_text())
+        print(self.gapless.gap_stats_text())
+        print(self.seek_throttle.stats_text())
+        if self.visualizer is not None:
+            self.visualizer.set_active(False)
+        if self.control_server is not None:
+            self.control_server.stop()
         self.tray_icon.hide()
         self.lyric_overlay.close()
         event.accept()
 
 if __name__ == "__main__":
+    # 打包成 exe 后，进程池（响度分析、--bench-decode）的子进程需要靠它跳过主程序
+    multiprocessing.freeze_support()
     from PyQt5.QtWidgets import QSplashScreen  # 添加这行（如果你还没导入）
     from PyQt5.QtCore import QEventLoop
 
+    # 时长读取基准：python player_v7.py --bench-duration <音乐文件夹>（递归）
+    if "--bench-duration" in sys.argv:
+        folder = sys.argv[sys.argv.index("--bench-duration") + 1]
+        files = [os.path.join(root, f) for root, _, names in os.walk(folder) for f in names
+                 if f.lower().endswith(MUSIC_EXTENSIONS)]
+        for name, sec in benchmark_duration_readers(files).items():
+            print(f"{name}: {sec:.2f} s（{len(files)} 个文件）")
+        sys.exit(0)
+
+    # VLC 实例配置探针（由 --bench-vlc 在子进程中调用），输出一行 JSON
+    if "--vlc-probe" in sys.argv:
+        i = sys.argv.index("--vlc-probe")
+        probe_path = sys.argv[i + 2] if len(sys.argv) > i + 2 else None
+        print(json.dumps(probe_vlc_profile(sys.argv[i + 1], probe_path)))
+        sys.exit(0)
+
+    # VLC 配置基准：python player_v7.py --bench-vlc [音频文件]，比较启动耗时与内存
+    if "--bench-vlc" in sys.argv:
+        i = sys.argv.index("--bench-vlc")
+        bench_path = sys.argv[i + 1] if len(sys.argv) > i + 1 else None
+        def fmt(v, unit):
+            return f"{v:.1f} {unit}" if v is not None else "—"
+        for profile, r in benchmark_vlc_profiles(bench_path).items():
+            print(f"{VLC_PROFILE_NAMES[profile]}：启动 {fmt(r['startup_ms'], 'ms')}，"
+                  f"出声 {fmt(r['first_audio_ms'], 'ms')}，RSS {fmt(r['rss_mb'], 'MB')}"
+                  f"（增量 {fmt(r['rss_delta_mb'], 'MB')}）")
+        sys.exit(0)
+
+    # 解码吞吐基准：python player_v7.py --bench-decode <音乐文件夹>（递归，进程池）
+    if "--bench-decode" in sys.argv:
+        folder = sys.argv[sys.argv.index("--bench-decode") + 1]
+        files = [os.path.join(root, f) for root, _, names in os.walk(folder) for f in names
+                 if f.lower().endswith(MUSIC_EXTENSIONS)]
+        r = benchmark_decode(files)
+        print(f"{len(files)} 个文件，{r['audio_sec']:.0f} 秒音频，{r['workers']} 进程用时 {r['wall_sec']:.2f} 秒")
+        print(f"每核 {r['per_core']:.0f}× 实时，总计 {r['total']:.0f}× 实时")
+        sys.exit(0)
+
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(resource_path("player_icon.ico")))
+
+    # 封面解码微基准：python player_v7.py --bench-cover <音乐文件夹>
+    if "--bench-cover" in sys.argv:
+        folder = sys.argv[sys.argv.index("--bench-cover") + 1]
+        files = [os.path.join(folder, f) for f in os.listdir(folder)
+                 if f.lower().endswith((".mp3", ".wav", ".flac", ".m4a"))]
+        for name, ms in benchmark_cover_decode(files).items():
+            print(f"{name}: {ms:.2f} ms/张（{len(files)} 个文件）")
+        sys.exit(0)
     try:
         with open(resource_path("material_style.qss"), "r", encoding="utf-8") as f:
             app.setStyleSheet(f.read())